@@ -0,0 +1,189 @@
+"""
+Outbound pipeline for raid announcements and raid request replies
+
+Discord must receive an interaction response within 3 seconds. Handlers call
+Announcer.arm first; if they have not replied when the window is about to run
+out (a cold settings load, a slow cooldown claim), a single watchdog task
+defers the interaction and the reply is sent later as a followup.
+
+Sends go through per-route token buckets (Discord allows about 5 messages per 5
+seconds per channel) so bursts wait locally instead of collecting 429s. The bot
+sets max_ratelimit_timeout, so discord.py raises RateLimited for long waits
+instead of sleeping; the bucket is then blocked for retry_after and the send is
+retried. Send latency and failure causes are recorded in metrics, and each
+send is a span in the current command's trace.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import discord
+
+from metrics import INTERACTION_DEFERRALS, SEND_FAILURES, SEND_LATENCY
+from tracing import span
+
+# Defer once this much of the 3 second interaction window has been used
+# (counted from when the command tree received the interaction)
+DEFER_AFTER = 2.0
+# Unknown Interaction: the token expired before we answered
+UNKNOWN_INTERACTION = 10062
+
+
+def failure_reason(error: BaseException) -> str:
+    """Low-cardinality label for why a send failed"""
+    if isinstance(error, discord.RateLimited):
+        return 'rate_limited'
+    if isinstance(error, discord.NotFound):
+        return 'interaction_expired' if getattr(error, 'code', None) == UNKNOWN_INTERACTION else 'not_found'
+    if isinstance(error, discord.Forbidden):
+        return 'forbidden'
+    if isinstance(error, discord.HTTPException):
+        return 'rate_limited' if error.status == 429 else 'http_error'
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    return 'error'
+
+
+class RouteBucket:
+    """Token bucket for one route, also blocked outright after a 429"""
+    __slots__ = ('capacity', 'per', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, capacity: int, per: float):
+        self.capacity = capacity
+        self.per = per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds to wait before the next send on this route"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.per)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.per / self.capacity
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now: float, retry_after: float):
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.tokens = 0.0
+
+
+class Announcer:
+    """Rate-limit-aware sender shared by the raid request handler and the raid queue"""
+
+    def __init__(self, capacity: int = 5, per: float = 5.0, attempts: int = 3, max_routes: int = 10000):
+        self.capacity = capacity
+        self.per = per
+        self.attempts = attempts
+        self.max_routes = max_routes
+        self._buckets: 'OrderedDict[str, RouteBucket]' = OrderedDict()
+        # interaction id: (perf_counter deadline, interaction), in the order they were armed
+        self._deadlines: Dict[int, Tuple[float, discord.Interaction]] = {}
+
+    def bucket(self, route: str) -> RouteBucket:
+        """Bucket for a route, evicting the least recently used once there are too many"""
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            bucket = self._buckets[route] = RouteBucket(self.capacity, self.per)
+            if len(self._buckets) > self.max_routes:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(route)
+        return bucket
+
+    async def _send(self, route: Optional[str], kind: str, send: Callable[[], Awaitable]):
+        """Run a send through the route's bucket, retrying after rate limits
+
+        Interaction replies pass route=None: each interaction has its own webhook
+        token, so they skip the buckets and only wait out a 429's retry_after.
+        """
+        bucket = self.bucket(route) if route is not None else None
+        with span(f'send.{kind}'):
+            for attempt in range(1, self.attempts + 1):
+                if bucket is not None:
+                    delay = bucket.delay(time.monotonic())
+                    while delay > 0:
+                        await asyncio.sleep(delay)
+                        delay = bucket.delay(time.monotonic())
+                    bucket.take()
+                started = time.perf_counter()
+                try:
+                    result = await send()
+                except Exception as e:
+                    reason = failure_reason(e)
+                    SEND_LATENCY.observe(time.perf_counter() - started, kind=kind, outcome=reason)
+                    SEND_FAILURES.inc(kind=kind, reason=reason)
+                    if reason != 'rate_limited' or attempt == self.attempts:
+                        raise
+                    retry_after = getattr(e, 'retry_after', None) or self.per
+                    if bucket is not None:
+                        bucket.block(time.monotonic(), retry_after)
+                    else:
+                        await asyncio.sleep(retry_after)
+                    continue
+                SEND_LATENCY.observe(time.perf_counter() - started, kind=kind, outcome='ok')
+                return result
+
+    def arm(self, interaction: discord.Interaction):
+        """Have the watchdog defer this interaction if it is still unanswered near the deadline"""
+        started_at = interaction.extras.get('started_at') or time.perf_counter()
+        self._deadlines[interaction.id] = (started_at + DEFER_AFTER, interaction)
+
+    def disarm(self, interaction: discord.Interaction):
+        """Stop watching an interaction (it was answered, or its handler failed)"""
+        self._deadlines.pop(interaction.id, None)
+
+    async def watch_deadlines(self, interval: float = 0.25):
+        """Single task that defers every armed interaction whose window is about to run out"""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            # Armed in arrival order, so stop at the first one that still has time
+            for interaction_id, (deadline, interaction) in list(self._deadlines.items()):
+                if deadline > now:
+                    break
+                del self._deadlines[interaction_id]
+                interaction.extras['deferral'] = asyncio.ensure_future(self.defer(interaction))
+
+    async def defer(self, interaction: discord.Interaction):
+        """Acknowledge the interaction publicly ("thinking...") so the reply can come later"""
+        if interaction.response.is_done():
+            return
+        INTERACTION_DEFERRALS.inc()
+        await self._send(None, 'defer', lambda: interaction.response.defer(thinking=True))
+
+    async def reply(self, interaction: discord.Interaction, content: str, *, ephemeral: bool = False,
+                    allowed_mentions: Optional[discord.AllowedMentions] = None):
+        """Answer an interaction, as a followup if it was already deferred"""
+        self.disarm(interaction)
+        deferral = interaction.extras.pop('deferral', None)
+        if deferral is not None:
+            try:
+                await deferral
+            except Exception:
+                pass  # counted in SEND_FAILURES; the reply below reports its own outcome
+        kwargs = {'ephemeral': ephemeral}
+        if allowed_mentions is not None:
+            kwargs['allowed_mentions'] = allowed_mentions
+        if not interaction.response.is_done():
+            return await self._send(None, 'response', lambda: interaction.response.send_message(content, **kwargs))
+        if ephemeral:
+            # The deferral was public; replace the "thinking..." message with a private reply
+            try:
+                await self._send(None, 'followup', interaction.delete_original_response)
+            except discord.HTTPException:
+                pass
+        return await self._send(None, 'followup', lambda: interaction.followup.send(content, **kwargs))
+
+    async def send(self, channel, content: str, *, allowed_mentions: Optional[discord.AllowedMentions] = None):
+        """Post a message to a channel outside of an interaction"""
+        return await self._send(
+            f'channel:{channel.id}', 'channel', lambda: channel.send(content, allowed_mentions=allowed_mentions)
+        )
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the /raidrequest hot path
+
+Runs sanitize_message, the cooldown helpers and the full raid_request handler
+against mocked interactions using the in-memory storage backend, and reports
+throughput and p50/p99 latency. Results can be saved and compared against a
+previous run to catch regressions.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+# The benchmark never talks to Firebase or Discord
+os.environ['STORAGE_BACKEND'] = 'memory'
+
+import bot  # noqa: E402
+from fake_discord import FakeGuild, FakeInteraction  # noqa: E402
+from guild_config import GuildConfig  # noqa: E402
+
+GUILD_ID = 1000
+GUILD_KEY = str(GUILD_ID)  # guild-scope cooldown key
+CHANNEL_ID = 2000
+ROLE_IDS = [3001, 3002, 3003]
+
+MESSAGES = {
+    'plain': "Looking for Vault of Glass fresh run tonight, need two more",
+    'markdown': "**Need** __two__ more for *King's Fall* ~~tonight~~ `now` > at reset ||bring relics|| " * 3,
+    'nested_spoilers': "||" * 200 + "raid" + "||" * 200,
+    'mentions': "@everyone <@123456789> <@!987654321> <@&555> <#777> @here join " * 20,
+    'long_4000': ("word " * 800)[:4000],
+    'adversarial_4000': ("**_~~`<@&1>||" * 400)[:4000],
+}
+
+
+def summarize(name, samples_ns, total_s):
+    """Summarize per-call latencies in microseconds"""
+    ordered = sorted(samples_ns)
+    count = len(ordered)
+    return {
+        'name': name,
+        'calls': count,
+        'ops_per_sec': count / total_s if total_s else 0.0,
+        'mean_us': statistics.fmean(ordered) / 1000,
+        'p50_us': ordered[count // 2] / 1000,
+        'p99_us': ordered[min(count - 1, int(count * 0.99))] / 1000,
+    }
+
+
+def bench_sync(name, func, iterations):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - t0)
+    return summarize(name, samples, time.perf_counter() - start)
+
+
+async def bench_async(name, make_coro, iterations, before=None):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if before is not None:
+            before()
+        coro = make_coro()
+        t0 = time.perf_counter_ns()
+        await coro
+        samples.append(time.perf_counter_ns() - t0)
+    return summarize(name, samples, time.perf_counter() - start)
+
+
+def reset_cooldown():
+    """Forget the benchmark guild's cooldown locally and in the in-memory store"""
+    bot.cooldowns.clear(GUILD_KEY)
+    bot.storage.tables.get('cooldowns', {}).pop(GUILD_KEY, None)
+
+
+def seed_guild():
+    """Configure the benchmark guild as /setupraidreq would"""
+    bot.save_guild_settings(GUILD_ID, GuildConfig(
+        setup_complete=True,
+        cooldown_seconds=1800,
+        allowed_channels=[CHANNEL_ID],
+        pinged_roles=ROLE_IDS + [GUILD_ID],
+    ))
+
+
+async def run_benchmarks(iterations):
+    results = []
+
+    for label, message in MESSAGES.items():
+        results.append(bench_sync(f'sanitize_message[{label}]', lambda m=message: bot.sanitize_message(m), iterations))
+
+    results.append(await bench_async(
+        'claim_cooldown',
+        lambda: bot.claim_cooldown(GUILD_KEY, 1800),
+        iterations,
+        before=reset_cooldown
+    ))
+    results.append(bench_sync('is_on_cooldown[hit]', lambda: bot.is_on_cooldown(GUILD_KEY), iterations))
+    results.append(bench_sync('is_on_cooldown[miss]', lambda: bot.is_on_cooldown(str(GUILD_ID + 1)), iterations))
+
+    seed_guild()
+    guild = FakeGuild(GUILD_ID, ROLE_IDS)
+    handler = bot.raid_request.callback
+
+    for label, message in MESSAGES.items():
+        results.append(await bench_async(
+            f'raid_request[posted,{label}]',
+            lambda m=message: handler(FakeInteraction(guild, CHANNEL_ID), m),
+            iterations,
+            before=reset_cooldown
+        ))
+
+    await bot.claim_cooldown(GUILD_KEY, 1800)
+    results.append(await bench_async(
+        'raid_request[on_cooldown]',
+        lambda: handler(FakeInteraction(guild, CHANNEL_ID), MESSAGES['plain']),
+        iterations
+    ))
+    results.append(await bench_async(
+        'raid_request[wrong_channel]',
+        lambda: handler(FakeInteraction(guild, channel_id=CHANNEL_ID + 1), MESSAGES['plain']),
+        iterations
+    ))
+
+    await bot.settings_writer.close()
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"{'benchmark':<40} {'ops/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'vs base':>9}")
+    print("-" * 85)
+    for result in results:
+        change = ""
+        if baseline and result['name'] in baseline:
+            change = f"{result['p99_us'] / baseline[result['name']]['p99_us'] - 1:+.0%}"
+        print(f"{result['name']:<40} {result['ops_per_sec']:>12,.0f} {result['p50_us']:>10.1f} "
+              f"{result['p99_us']:>10.1f} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /raidrequest hot path")
+    parser.add_argument("--iterations", type=int, default=5000, help="Calls per benchmark")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare p99 latency against a saved JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed p99 slowdown vs --compare before failing (default 0.25)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args.iterations))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r['name']: r for r in json.load(f)}
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if baseline:
+        regressions = [
+            r['name'] for r in results
+            if r['name'] in baseline and r['p99_us'] > baseline[r['name']]['p99_us'] * (1 + args.tolerance)
+        ]
+        if regressions:
+            print(f"\n❌ p99 regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print("\n✅ No p99 regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
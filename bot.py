@@ -1,158 +1,858 @@
+import time
+PROCESS_STARTED_AT = time.perf_counter()  # measured before the heavy imports below
+
 import discord
 from discord.ext import commands
 from discord import app_commands
+import hashlib
 import json
-import requests
 import asyncio
-import time
 import re
 import os
+import signal
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-# Load environment variables
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass  # dotenv is optional
+from announcer import Announcer
+from cooldowns import COOLDOWN_SCOPES, SCOPE_CHANNEL, SCOPE_GUILD, SCOPE_USER, CooldownTracker, cooldown_key, guild_of
+from guild_config import MAX_ALLOWED_CHANNELS, MAX_PINGED_ROLES, GuildConfig
+from metrics import (
+    COMMAND_LATENCY, RAID_REJECTIONS, RAIDS_POSTED, RAIDS_QUEUED, SETTINGS_STREAM_UPDATES, STORAGE_ERRORS,
+    STORAGE_LATENCY, registry
+)
+from raid_history import RaidHistory
+from raid_queue import MAX_QUEUE_SIZE, QueuedRaid, RaidQueue
+from sharding import ShardConfig
+from storage import GuildSettingsCache, WriteBehindBuffer, create_storage
+from tracing import ProfileCapture, Tracer, span
+
+# Load environment variables (dotenv is optional and only imported when there is a .env file)
+if os.path.exists('.env'):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
 
 # Bot setup
 intents = discord.Intents.default()
 intents.message_content = True
 # Allow the bot to mention everyone and all roles
 allowed_mentions = discord.AllowedMentions(everyone=True, roles=True, users=True)
-bot = commands.Bot(command_prefix='!', intents=intents, allowed_mentions=allowed_mentions)
 
-# Global storage for settings and cooldowns
-guild_settings: Dict[int, Dict] = {}
-cooldown_data: Dict[int, Dict] = {}  # guild_id: {"end_time": timestamp}
+# Sharding (SHARD_COUNT=auto|N, optional SHARD_IDS=0-3); unset runs one gateway connection
+shard_config = ShardConfig.from_env()
+BotBase = commands.AutoShardedBot if shard_config.enabled else commands.Bot
 
 
+class RaidRequestTree(app_commands.CommandTree):
+    """Command tree that records how long each slash command takes and can be drained"""
 
-# Firebase config
-FIREBASE_URL = os.getenv("FIREBASE_URL")
-FIREBASE_SECRET = os.getenv("FIREBASE_SECRET")
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self.accepting = True
+        # Interaction ids of commands that have started but not finished
+        self.in_flight: Set[int] = set()
 
-if not FIREBASE_URL:
-    print("Error: FIREBASE_URL environment variable is not set. Please set it in your .env file.")
-    exit(1)
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if not self.accepting:
+            await interaction.response.send_message("The bot is restarting, please try again in a moment.", ephemeral=True)
+            return False
+        started_at = interaction.extras['started_at'] = time.perf_counter()
+        self.in_flight.add(interaction.id)
+        trace = tracer.start(interaction, started_at)
+        if trace is not None:
+            interaction.extras['trace'] = trace
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        announcer.disarm(interaction)
+        observe_command(interaction, interaction.command, 'error')
+        await super().on_error(interaction, error)
+
+    async def drain(self, timeout: float) -> bool:
+        """Refuse new commands and wait for running ones; False if some are still running"""
+        self.accepting = False
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        return not self.in_flight
+
+
+def observe_command(interaction: discord.Interaction, command, outcome: str):
+    """Record a finished command in the latency histogram (and its trace, if sampled)"""
+    bot.tree.in_flight.discard(interaction.id)
+    started_at = interaction.extras.get('started_at')
+    if started_at is not None and command is not None:
+        COMMAND_LATENCY.observe(time.perf_counter() - started_at, command=command.name, outcome=outcome)
+    trace = interaction.extras.pop('trace', None)
+    if trace is not None:
+        tracer.finish(trace, outcome)
+
+
+class RaidRequestBot(BotBase):
+    """Bot that serves health checks, restores cooldowns on startup and drains and flushes on shutdown"""
+
+    shutting_down = False
+
+    async def setup_hook(self):
+        # Health/readiness endpoints run on this event loop (Render port binding);
+        # aiohttp.web is only imported once the bot is actually starting
+        from webserver import HealthServer
+        self.web_server = HealthServer(self, metrics_registry=registry, reload=reload_guild_settings)
+        await self.web_server.start()
+        self.install_signal_handlers()
+        await load_cooldowns()
+        self.cooldown_sweeper = asyncio.create_task(sweep_cooldowns())
+        self.raid_queue_scheduler = asyncio.create_task(run_raid_queue())
+        self.defer_watchdog = asyncio.create_task(announcer.watch_deadlines())
+        if SETTINGS_STREAM:
+            self.settings_follower = asyncio.create_task(follow_settings_changes())
+        if COMPACT_INTERVAL > 0:
+            self.compactor = asyncio.create_task(run_compaction())
+        await sync_commands_if_changed(self.tree)
+
+    def install_signal_handlers(self):
+        """SIGTERM/SIGINT drain and shut down; SIGHUP reloads changed guild settings"""
+        self._signal_tasks: Set[asyncio.Task] = set()
+        loop = asyncio.get_running_loop()
+        handlers = {'SIGTERM': self.shutdown, 'SIGINT': self.shutdown, 'SIGHUP': reload_guild_settings}
+        for name, handler in handlers.items():
+            try:
+                loop.add_signal_handler(getattr(signal, name), self._run_signal_task, handler, name)
+            except (AttributeError, NotImplementedError, RuntimeError):
+                pass  # not available on this platform (e.g. Windows); Ctrl+C still closes the bot
+
+    def _run_signal_task(self, handler, name: str):
+        print(f"Received {name}")
+        task = asyncio.create_task(handler())
+        self._signal_tasks.add(task)
+        task.add_done_callback(self._signal_tasks.discard)
+
+    async def shutdown(self):
+        """Finish in-flight commands (up to SHUTDOWN_GRACE seconds), then close and flush storage"""
+        if self.shutting_down:
+            return
+        self.shutting_down = True
+        print(f"Shutting down: waiting for {len(self.tree.in_flight)} in-flight command(s)")
+        if not await self.tree.drain(SHUTDOWN_GRACE):
+            print(f"Grace period over with {len(self.tree.in_flight)} command(s) still running")
+        await self.close()
 
-if not FIREBASE_SECRET:
-    print("Error: FIREBASE_SECRET environment variable is not set. Please set it in your .env file.")
+    async def close(self):
+        for task_name in ('cooldown_sweeper', 'raid_queue_scheduler', 'defer_watchdog', 'settings_follower', 'compactor'):
+            task = getattr(self, task_name, None)
+            if task is not None:
+                task.cancel()
+        web_server = getattr(self, 'web_server', None)
+        if web_server is not None:
+            await web_server.stop()
+        await settings_writer.close()
+        await history_writer.close()
+        await storage.close()
+        await super().close()
+
+
+# Hand long rate limits back to the announce pipeline (as discord.RateLimited) instead of sleeping in discord.py
+# (discord.py enforces a minimum of 30 seconds)
+bot_options = {'max_ratelimit_timeout': max(30.0, float(os.getenv('MAX_RATELIMIT_WAIT', 30)))}
+if shard_config.enabled:
+    bot_options.update(shard_count=shard_config.shard_count, shard_ids=shard_config.shard_ids)
+# Point the HTTP client at a local fake Discord API (see fake_discord.py) for testing
+if os.getenv('DISCORD_API_BASE'):
+    discord.http.Route.BASE = os.getenv('DISCORD_API_BASE').rstrip('/')
+bot = RaidRequestBot(
+    command_prefix='!', intents=intents, allowed_mentions=allowed_mentions, tree_cls=RaidRequestTree, **bot_options
+)
+
+# Global storage for cooldowns (guild settings live in settings_cache)
+cooldowns = CooldownTracker()
+COOLDOWN_SWEEP_INTERVAL = int(os.getenv('COOLDOWN_SWEEP_INTERVAL', 60))
+# Seconds between storage compaction passes (0 disables them), and guilds loaded per pass step
+COMPACT_INTERVAL = float(os.getenv('COMPACT_INTERVAL', 6 * 3600))
+COMPACT_CHUNK_SIZE = 500
+# Conditional writes (pruned guilds, expired cooldowns) run concurrently during compaction
+COMPACT_CONCURRENCY = 20
+# Seconds a SIGTERM waits for running commands before closing anyway
+SHUTDOWN_GRACE = float(os.getenv('SHUTDOWN_GRACE', 10))
+
+# Rate-limit-aware sender for raid posts and raid request replies
+announcer = Announcer()
+
+# Sampled command traces (TRACE_SAMPLE_RATE) and the /profile capture
+tracer = Tracer.from_env()
+profiler = ProfileCapture(os.getenv('PROFILE_DIR', 'profiles'))
+# Longest /profile capture, in seconds
+MAX_PROFILE_SECONDS = 120
+
+# Requests waiting for a cooldown to end, posted by the run_raid_queue task
+raid_queue = RaidQueue()
+raid_queue_wakeup = asyncio.Event()
+QUEUE_RETRY_SECONDS = 5
+
+
+# Storage backend (STORAGE_BACKEND=firebase|sqlite|log|memory)
+try:
+    storage = create_storage()
+except ValueError as e:
+    print(f"Error: {e}")
     exit(1)
 
 
-def load_settings():
-    """Load guild settings from Firebase Realtime Database (legacy REST API)"""
-    global guild_settings
+
+async def timed_storage(operation: str, awaitable):
+    """Await a storage call, recording its latency and whether it failed"""
+    with STORAGE_LATENCY.time(operation=operation), span(f'storage.{operation}'):
+        try:
+            return await awaitable
+        except Exception:
+            STORAGE_ERRORS.inc(operation=operation)
+            raise
+
+
+settings_writer = WriteBehindBuffer(lambda changes: timed_storage('save_guilds', storage.save_guilds(changes)))
+
+
+async def fetch_guild_settings(guild_id: int) -> Optional[GuildConfig]:
+    """Load one guild's settings, preferring an edit that has not been written yet"""
+    if settings_writer.is_pending(guild_id):
+        data = settings_writer.pending_value(guild_id)
+    else:
+        data = await timed_storage('load_guild', storage.load_guild(guild_id))
+    return GuildConfig.from_dict(data) if data else None
+
+
+settings_cache = GuildSettingsCache(
+    fetch_guild_settings,
+    max_size=int(os.getenv('SETTINGS_CACHE_SIZE', 1000)),
+    ttl=float(os.getenv('SETTINGS_CACHE_TTL', 300))
+)
+
+
+# Guilds re-read per store round trip by reload_guild_settings
+RELOAD_CHUNK_SIZE = 500
+# Follow other processes' settings edits through the store's change stream. Each connect downloads
+# the whole table, so it is on by default only when sharded; SETTINGS_STREAM=1 or 0 overrides that
+SETTINGS_STREAM = os.getenv('SETTINGS_STREAM', '1' if shard_config.enabled else '0') != '0'
+SETTINGS_STREAM_MAX_BACKOFF = 60
+
+
+async def save_histories(changes: Dict[int, Optional[RaidHistory]]):
+    """Write raid histories, serialized at flush time since they change in place"""
+    data = {guild_id: history.to_dict() if history else None for guild_id, history in changes.items()}
+    await timed_storage('save_histories', storage.save_histories(data))
+
+
+# Histories change with every posted raid, so they are written in bigger, less frequent batches than settings
+history_writer = WriteBehindBuffer(save_histories, delay=float(os.getenv('RAID_HISTORY_FLUSH', 30)))
+
+
+async def fetch_history(guild_id: int) -> RaidHistory:
+    """Load one guild's raid history, preferring the copy waiting to be written"""
+    if history_writer.is_pending(guild_id):
+        # A pending None is a deleted history (the guild was removed)
+        return history_writer.pending_value(guild_id) or RaidHistory()
+    return RaidHistory.from_dict(await timed_storage('load_history', storage.load_history(guild_id)))
+
+
+history_cache = GuildSettingsCache(fetch_history, max_size=int(os.getenv('SETTINGS_CACHE_SIZE', 1000)), ttl=3600)
+
+
+registry.gauge('raidrequest_cached_guilds', 'Guild settings held in the LRU cache', lambda: len(settings_cache))
+registry.gauge('raidrequest_active_cooldowns', 'Cooldowns currently tracked in memory', lambda: len(cooldowns))
+registry.gauge('raidrequest_queued_raids', 'Raid requests waiting for a cooldown to end', lambda: len(raid_queue))
+registry.gauge('raidrequest_pending_settings_writes', 'Guilds waiting for a write-behind flush',
+               lambda: settings_writer.pending)
+registry.gauge('raidrequest_pending_history_writes', 'Raid histories waiting for a batched write',
+               lambda: history_writer.pending)
+
+
+async def get_guild_settings(guild_id: int) -> Optional[GuildConfig]:
+    """Get a guild's settings from the cache, loading them on first use"""
     try:
-        url = f"{FIREBASE_URL}/guild_settings.json?auth={FIREBASE_SECRET}"
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        if data:
-            guild_settings = {int(k): v for k, v in data.items()}
-        else:
-            guild_settings = {}
+        return await settings_cache.get(guild_id)
+    except Exception as e:
+        print(f"Error loading settings for guild {guild_id}: {e}")
+        return None
+
+
+def save_guild_settings(guild_id: int, settings: Optional[GuildConfig]):
+    """Update the cache and queue a guild's settings for the next batched write"""
+    settings_cache.set(guild_id, settings)
+    invalidate_announcement(guild_id)
+    settings_writer.mark_dirty(guild_id, settings.to_dict() if settings else None)
+
+def apply_stored_settings(guild_id: int, data: Optional[Dict]) -> bool:
+    """Replace a cached guild's settings with the stored value; returns whether they changed"""
+    current = settings_cache.peek(guild_id)
+    if (current.to_dict() if current else None) == data:
+        settings_cache.set(guild_id, current)  # restart its TTL
+        return False
+    settings_cache.set(guild_id, GuildConfig.from_dict(data) if data else None)
+    invalidate_announcement(guild_id)
+    return True
+
+async def reload_guild_settings() -> Dict:
+    """Re-read cached guilds from the store and replace only the ones that changed"""
+    checked = changed = 0
+    guild_ids = settings_cache.guild_ids()
+    try:
+        for start in range(0, len(guild_ids), RELOAD_CHUNK_SIZE):
+            chunk = [guild_id for guild_id in guild_ids[start:start + RELOAD_CHUNK_SIZE]
+                     if not settings_writer.is_pending(guild_id)]
+            # Settings objects are replaced, never edited, so identity tells whether a guild changed
+            before = {guild_id: settings_cache.peek(guild_id) for guild_id in chunk}
+            stored = await timed_storage('load_guilds', storage.load_guilds(chunk))
+            for guild_id in chunk:
+                # Skip guilds edited (even if already flushed) or evicted while the chunk was loading
+                if (settings_writer.is_pending(guild_id) or guild_id not in settings_cache
+                        or settings_cache.peek(guild_id) is not before[guild_id]):
+                    continue
+                checked += 1
+                if apply_stored_settings(guild_id, stored.get(guild_id)):
+                    changed += 1
     except Exception as e:
-        print(f"Error loading settings from Firebase: {e}")
-        guild_settings = {}
+        print(f"Error reloading guild settings: {e}")
+        return {'checked': checked, 'changed': changed, 'error': str(e)}
+    print(f"Reloaded guild settings: {changed} of {checked} cached guild(s) changed")
+    return {'checked': checked, 'changed': changed}
+
+def apply_settings_changes(changes: Dict[int, Optional[Dict]], complete: bool) -> int:
+    """Patch cached guilds with streamed changes; returns how many were replaced
 
+    Guilds that are not cached load fresh on first use, and guilds with an
+    unflushed local edit keep it (the stream may still be echoing an older write).
+    """
+    changed = 0
+    # A complete snapshot also covers cached guilds deleted from the store
+    for guild_id in (settings_cache.guild_ids() if complete else changes):
+        if settings_writer.is_pending(guild_id) or guild_id not in settings_cache:
+            continue
+        if apply_stored_settings(guild_id, changes.get(guild_id)):
+            changed += 1
+    SETTINGS_STREAM_UPDATES.inc(changed)
+    return changed
+
+async def follow_settings_changes():
+    """Keep cached settings in step with edits made by other bot processes"""
+    backoff = 1
+    while True:
+        try:
+            async for changes, complete in storage.watch_guilds():
+                backoff = 1
+                changed = apply_settings_changes(changes, complete)
+                if complete:
+                    print(f"Settings stream connected ({changed} cached guild(s) were out of date)")
+        except NotImplementedError:
+            print("Storage backend cannot stream changes; other processes' edits show up after SETTINGS_CACHE_TTL or a reload")
+            return
+        except Exception as e:
+            print(f"Settings stream error: {e}")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, SETTINGS_STREAM_MAX_BACKOFF)
 
-def save_settings():
-    """Save guild settings to Firebase Realtime Database (legacy REST API)"""
+async def record_raid(guild_id: int, user_id: int, message: str):
+    """Add a posted raid to its guild's history and queue the history for the next batch"""
     try:
-        url = f"{FIREBASE_URL}/guild_settings.json?auth={FIREBASE_SECRET}"
-        settings_to_save = {str(k): v for k, v in guild_settings.items()}
-        resp = requests.put(url, json=settings_to_save, timeout=10)
-        resp.raise_for_status()
+        history = await history_cache.get(guild_id)
     except Exception as e:
-        print(f"Error saving settings to Firebase: {e}")
+        # Skip rather than start an empty history that would overwrite the stored one
+        print(f"Error loading raid history for guild {guild_id}: {e}")
+        return
+    history.record(int(time.time()), user_id, message)
+    history_writer.mark_dirty(guild_id, history)
+
+def write_compacted_settings(guild_id: int, settings: Optional[GuildConfig]):
+    """Queue a pruned (or deleted) guild for the next batched write without pulling it into the cache"""
+    if guild_id in settings_cache:
+        settings_cache.set(guild_id, settings)
+    invalidate_announcement(guild_id)
+    settings_writer.mark_dirty(guild_id, settings.to_dict() if settings else None)
+
+async def write_compacted_guild(guild_id: int, stored: Dict, settings: Optional[GuildConfig]) -> bool:
+    """Replace a guild's stored settings with a pruned (or deleted) copy, unless they changed since the read
+
+    The write is conditional on the exact value read, so an edit saved in the meantime (by
+    this or another process) wins and the guild is left for the next pass.
+    """
+    written = await timed_storage('replace_guild_if_unchanged', storage.replace_guild_if_unchanged(
+        guild_id, stored, settings.to_dict() if settings else None
+    ))
+    if written:
+        # A local edit queued during the write is newer; leave its cache entry alone
+        if guild_id in settings_cache and not settings_writer.is_pending(guild_id):
+            settings_cache.set(guild_id, settings)
+        invalidate_announcement(guild_id)
+    return written
+
+def forget_history(guild_id: int):
+    """Queue a guild's raid history for deletion"""
+    history_cache.invalidate(guild_id)
+    history_writer.mark_dirty(guild_id, None)
 
-def is_setup_complete(guild_id: int) -> bool:
+def is_setup_complete(settings: Optional[GuildConfig]) -> bool:
     """Check if setup has been completed for a guild"""
-    return guild_id in guild_settings and guild_settings[guild_id].get('setup_complete', False)
+    return settings is not None and settings.setup_complete
+
+def report_setup_cleared(guild_id: int, before: GuildConfig, after: Optional[GuildConfig]):
+    """Log a guild whose last allowed channel or pinged role was deleted, undoing its setup"""
+    if before.setup_complete and after is not None and not after.setup_complete:
+        print(f"Guild {guild_id} lost its last allowed channel or pinged role; it needs /setupraidreq again")
+
+def format_role_mention(role: discord.Role) -> str:
+    """Display form of a role, with @everyone shown as plain text"""
+    return "@everyone" if role.name == "@everyone" else role.mention
+
+
+class Announcement:
+    """Precomputed mention prefix and AllowedMentions for a guild's raid posts"""
+    __slots__ = ('settings', 'prefix', 'allowed_mentions')
+
+    def __init__(self, settings: GuildConfig, prefix: str, allowed_mentions: discord.AllowedMentions):
+        self.settings = settings
+        self.prefix = prefix
+        self.allowed_mentions = allowed_mentions
+
+
+# guild_id: Announcement, rebuilt when settings or roles change. Without the members intent
+# the bot is not told when roles are added to or removed from it, so mention_everyone gained or lost
+# that way shows up once the guild's settings are reloaded (at most SETTINGS_CACHE_TTL later)
+announcement_cache: Dict[int, Announcement] = {}
+
+def build_announcement(guild: discord.Guild, settings: GuildConfig) -> Announcement:
+    """Build the role mention prefix with special handling for @everyone"""
+    role_mentions_list = []
+    mention_roles = []
+    mention_everyone = False
+    for role_id in settings.pinged_roles:
+        role = guild.get_role(role_id)
+        if role and role.name == "@everyone":
+            # Check if bot has permission to mention everyone
+            if guild.me.guild_permissions.mention_everyone:
+                role_mentions_list.append("@everyone")
+                mention_everyone = True
+            else:
+                role_mentions_list.append("@everyone (no permission)")
+        else:
+            role_mentions_list.append(f"<@&{role_id}>")
+            mention_roles.append(discord.Object(id=role_id))
+    
+    return Announcement(
+        settings,
+        ' '.join(role_mentions_list),
+        discord.AllowedMentions(everyone=mention_everyone, roles=mention_roles, users=True)
+    )
+
+def get_announcement(guild: discord.Guild, settings: GuildConfig) -> Announcement:
+    """Return the cached announcement for a guild, rebuilding it if its settings were replaced"""
+    announcement = announcement_cache.get(guild.id)
+    if announcement is None or announcement.settings is not settings:
+        announcement = build_announcement(guild, settings)
+        announcement_cache[guild.id] = announcement
+        # Bound the cache like the settings cache; dicts keep insertion order
+        if len(announcement_cache) > settings_cache.max_size:
+            del announcement_cache[next(iter(announcement_cache))]
+    return announcement
+
+def invalidate_announcement(guild_id: int):
+    """Force the next raid post in a guild to rebuild its mention prefix"""
+    announcement_cache.pop(guild_id, None)
+
+# Sanitizer patterns, applied in order. Each pass only deletes text, so a pass whose
+# trigger characters are missing from the current message can be skipped safely.
+_SANITIZE_TRIGGERS = re.compile(r'[@<|`>*_~]')
+_MENTION_EVERYONE = re.compile(r'@(everyone|here)', re.IGNORECASE)
+_USER_MENTION = re.compile(r'<@!?\d+>')
+_ROLE_MENTION = re.compile(r'<@&\d+>')
+_CHANNEL_MENTION = re.compile(r'<#\d+>')
+_SPOILER = re.compile(r'\|\|([^|]+)\|\|')
+_CODE_BLOCK = re.compile(r'```[^`]*```')
+_INLINE_CODE = re.compile(r'`([^`]+)`')
+_BLOCK_QUOTE = re.compile(r'^>\s*', re.MULTILINE)
+_BOLD = re.compile(r'\*\*([^*]+)\*\*')
+_UNDERLINE = re.compile(r'__([^_]+)__')
+_ITALIC_STAR = re.compile(r'\*([^*]+)\*')
+_ITALIC_UNDERSCORE = re.compile(r'_([^_]+)_')
+_STRIKETHROUGH = re.compile(r'~~([^~]+)~~')
 
 def sanitize_message(message: str) -> str:
     """Sanitize the message by removing mentions and formatting"""
-    # Remove @everyone and @here mentions
-    message = re.sub(r'@(everyone|here)', '', message, flags=re.IGNORECASE)
+    # Fast path: plain text only needs whitespace cleanup
+    if not _SANITIZE_TRIGGERS.search(message):
+        return ' '.join(message.split())
     
-    # Remove user mentions (<@!123456789> or <@123456789>)
-    message = re.sub(r'<@!?\d+>', '', message)
-    
-    # Remove role mentions (<@&123456789>)
-    message = re.sub(r'<@&\d+>', '', message)
+    # Remove @everyone and @here mentions
+    if '@' in message:
+        message = _MENTION_EVERYONE.sub('', message)
     
-    # Remove channel mentions (<#123456789>)
-    message = re.sub(r'<#\d+>', '', message)
+    # Remove user (<@!123> or <@123>), role (<@&123>) and channel (<#123>) mentions
+    if '<' in message:
+        message = _USER_MENTION.sub('', message)
+        message = _ROLE_MENTION.sub('', message)
+        message = _CHANNEL_MENTION.sub('', message)
     
-    # Remove formatting
     # Remove spoilers ||text||
-    message = re.sub(r'\|\|([^|]+)\|\|', r'\1', message)
+    if '||' in message:
+        message = _SPOILER.sub(r'\1', message)
     
-    # Remove code blocks ```text```
-    message = re.sub(r'```[^`]*```', '', message)
-    
-    # Remove inline code `text`
-    message = re.sub(r'`([^`]+)`', r'\1', message)
+    # Remove code blocks ```text``` and inline code `text`
+    if '`' in message:
+        message = _CODE_BLOCK.sub('', message)
+        message = _INLINE_CODE.sub(r'\1', message)
     
     # Remove block quotes > text
-    message = re.sub(r'^>\s*', '', message, flags=re.MULTILINE)
+    if '>' in message:
+        message = _BLOCK_QUOTE.sub('', message)
+    
+    # Remove bold **text** and __text__, then italic *text* and _text_
+    if '*' in message:
+        message = _BOLD.sub(r'\1', message)
+    if '__' in message:
+        message = _UNDERLINE.sub(r'\1', message)
+    if '*' in message:
+        message = _ITALIC_STAR.sub(r'\1', message)
+    if '_' in message:
+        message = _ITALIC_UNDERSCORE.sub(r'\1', message)
+    
+    # Remove strikethrough ~~text~~ (twice, so ~~~~text~~~~ is fully unwrapped)
+    if '~~' in message:
+        message = _STRIKETHROUGH.sub(r'\1', message)
+        message = _STRIKETHROUGH.sub(r'\1', message)
     
-    # Remove bold **text** and __text__
-    message = re.sub(r'\*\*([^*]+)\*\*', r'\1', message)
-    message = re.sub(r'__([^_]+)__', r'\1', message)
+    # Clean up extra whitespace
+    return ' '.join(message.split())
+
+def request_cooldown_key(settings: GuildConfig, interaction: discord.Interaction) -> str:
+    """Cooldown key for a request under the guild's configured scope"""
+    return cooldown_key(settings.cooldown_scope, interaction.guild.id, interaction.channel.id, interaction.user.id)
+
+def is_on_cooldown(key: str) -> tuple[bool, Optional[int]]:
+    """Check if a cooldown key is on cooldown and return cooldown end time"""
+    end_time = cooldowns.get(key, int(time.time()))
+    if end_time is None:
+        return False, None
     
-    # Remove italic *text* and _text_
-    message = re.sub(r'\*([^*]+)\*', r'\1', message)
-    message = re.sub(r'_([^_]+)_', r'\1', message)
+    return True, end_time
+
+async def claim_cooldown(key: str, duration: int) -> tuple[bool, Optional[int]]:
+    """Atomically start a cooldown; fails if any bot process already holds one"""
+    current_time = int(time.time())
+    end_time = cooldowns.get(key, current_time)
+    if end_time is not None:
+        return False, end_time
     
-    # Remove strikethrough ~~text~~
-    message = re.sub(r'~~([^~]+)~~', r'\1', message)
+    # Reserve locally first so concurrent requests in this process lose without a round trip
+    end_time = current_time + duration
+    cooldowns.set(key, end_time)
+    try:
+        claimed, stored_end_time = await timed_storage(
+            'claim_cooldown', storage.claim_cooldown(key, current_time, end_time)
+        )
+    except Exception as e:
+        print(f"Error claiming cooldown {key}, using local cooldown only: {e}")
+        return True, end_time
     
-    # Remove underline and other formatting
-    message = re.sub(r'~~([^~]+)~~', r'\1', message)
+    if not claimed:
+        # Another process won the race; adopt its cooldown
+        cooldowns.set(key, stored_end_time)
+        return False, stored_end_time
+    return True, end_time
+
+async def load_cooldowns():
+    """Restore running cooldowns for the guilds this process's shards own"""
+    try:
+        stored = await timed_storage('load_cooldowns', storage.load_cooldowns())
+    except Exception as e:
+        print(f"Error loading cooldowns: {e}")
+        return
     
-    # Clean up extra whitespace
-    message = ' '.join(message.split())
+    current_time = int(time.time())
+    for key, end_time in stored.items():
+        if end_time > current_time and shard_config.owns_guild(guild_of(key)):
+            cooldowns.set(key, end_time)
+
+async def sweep_cooldowns():
+    """Periodically drop expired cooldowns from memory in one batch
+
+    Expired entries stay in storage until the next claim overwrites them; deleting them
+    here could erase a cooldown another process has just claimed.
+    """
+    while True:
+        await asyncio.sleep(COOLDOWN_SWEEP_INTERVAL)
+        cooldowns.sweep(int(time.time()))
+
+def guild_is_gone(guild_id: int) -> bool:
+    """Whether this process's shards can see that the bot is no longer in a guild
+
+    Unavailable guilds (a Discord outage) are still listed, so they are kept.
+    """
+    return shard_config.owns_guild(guild_id) and bot.get_guild(guild_id) is None
+
+async def compact_guild_settings() -> Tuple[int, int]:
+    """Delete departed guilds and prune deleted channels/roles, a chunk of stored guilds at a time"""
+    removed = pruned = 0
+    # Store key order (as strings), so each chunk is a run of adjacent keys
+    guild_ids = sorted(await timed_storage('list_guilds', storage.list_guilds()), key=str)
+    for start in range(0, len(guild_ids), COMPACT_CHUNK_SIZE):
+        chunk = guild_ids[start:start + COMPACT_CHUNK_SIZE]
+        owned = [guild_id for guild_id in chunk if shard_config.owns_guild(guild_id)]
+        if not owned:
+            continue
+        if len(owned) == len(chunk):
+            stored = await timed_storage('load_guild_range', storage.load_guild_range(chunk))
+        else:
+            # Other processes own part of the chunk; fetch only this process's guilds
+            owned = [guild_id for guild_id in owned if not settings_writer.is_pending(guild_id)]
+            stored = await timed_storage('load_guilds', storage.load_guilds(owned))
+        writes: List[Tuple[int, Dict, Optional[GuildConfig]]] = []
+        for guild_id, data in stored.items():
+            # Local edits not yet saved win; the next pass looks at the guild again
+            if settings_writer.is_pending(guild_id):
+                continue
+            guild = bot.get_guild(guild_id)
+            if guild is None:
+                writes.append((guild_id, data, None))
+                continue
+            if guild.unavailable:
+                continue
+            settings = GuildConfig.from_dict(data)
+            kept = settings.pruned(
+                lambda channel_id: guild.get_channel(channel_id) is not None,
+                lambda role_id: guild.get_role(role_id) is not None
+            )
+            if kept is not settings:
+                report_setup_cleared(guild_id, settings, kept)
+                writes.append((guild_id, data, kept))
+        for write_start in range(0, len(writes), COMPACT_CONCURRENCY):
+            batch = writes[write_start:write_start + COMPACT_CONCURRENCY]
+            results = await asyncio.gather(*(write_compacted_guild(*write) for write in batch), return_exceptions=True)
+            for (guild_id, _, settings), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    print(f"Could not compact guild {guild_id}; the next pass retries it: {result}")
+                elif result and settings is None:
+                    removed += 1
+                elif result:
+                    pruned += 1
+    return removed, pruned
+
+async def compact_histories() -> int:
+    """Delete raid histories of guilds the bot has left"""
+    removed = 0
+    for guild_id in await timed_storage('list_histories', storage.list_histories()):
+        if guild_is_gone(guild_id) and not history_writer.is_pending(guild_id):
+            forget_history(guild_id)
+            removed += 1
+    return removed
+
+async def compact_cooldowns() -> int:
+    """Delete expired stored cooldowns (each only if no new claim replaced it meanwhile)"""
+    now = int(time.time())
+    stored = await timed_storage('load_cooldowns', storage.load_cooldowns())
+    expired = [key for key, end_time in stored.items()
+               if end_time is not None and end_time <= now and shard_config.owns_guild(guild_of(key))]
+    deleted = failed = 0
+    for start in range(0, len(expired), COMPACT_CONCURRENCY):
+        results = await asyncio.gather(
+            *(storage.delete_expired_cooldown(key, now) for key in expired[start:start + COMPACT_CONCURRENCY]),
+            return_exceptions=True
+        )
+        deleted += sum(1 for result in results if result is True)
+        failed += sum(1 for result in results if isinstance(result, Exception))
+    if failed:
+        print(f"Could not delete {failed} expired cooldown(s); the next pass retries them")
+    return deleted
+
+async def compact_storage() -> Dict:
+    """One compaction pass over everything cleanup events could have missed while the bot was offline"""
+    started = time.perf_counter()
+    removed, pruned = await compact_guild_settings()
+    histories = await compact_histories()
+    expired = await compact_cooldowns()
+    print(
+        f"Compacted storage in {time.perf_counter() - started:.1f}s: {removed} departed guild(s), "
+        f"{pruned} guild(s) with deleted channels/roles, {histories} orphaned raid history(ies), {expired} expired cooldown(s)"
+    )
+    return {'removed_guilds': removed, 'pruned_guilds': pruned, 'removed_histories': histories,
+            'expired_cooldowns': expired}
+
+async def run_compaction():
+    """Compact once every guild has arrived from the gateway, then every COMPACT_INTERVAL seconds"""
+    await bot.wait_until_ready()
+    while True:
+        # An empty guild list means missing intents or a bad connection, not that every guild left
+        if bot.guilds:
+            try:
+                await compact_storage()
+            except Exception as e:
+                print(f"Error compacting storage: {e}")
+        await asyncio.sleep(COMPACT_INTERVAL)
+
+def format_raid_message(announcement: Announcement, message: str, user_id: int, end_time: int) -> str:
+    """Public raid post: role pings, the quoted request and when the cooldown ends"""
+    return (
+        f"{announcement.prefix}\n"
+        f"> {message} - <@{user_id}>\n\n"
+        f"**Cooldown:** <t:{end_time}:R>"
+    )
+
+async def queue_raid(interaction: discord.Interaction, key: str, settings: GuildConfig, message: str, end_time: int):
+    """Hold a validated request until its cooldown ends, or reject it if the queue is full"""
+    position = raid_queue.push(
+        key, QueuedRaid(interaction.channel.id, interaction.user.id, message, time.time()), settings.queue_size
+    )
+    if position is None:
+        RAID_REJECTIONS.inc(reason='queue_full')
+        await announcer.reply(
+            interaction,
+            f"This command is on cooldown and the queue is full. Try again <t:{end_time}:R>.",
+            ephemeral=True
+        )
+        return
     
-    return message.strip()
+    raid_queue.schedule(key, end_time)
+    raid_queue_wakeup.set()
+    RAIDS_QUEUED.inc()
+    await announcer.reply(
+        interaction,
+        f"This command is on cooldown (ends <t:{end_time}:R>). Your request is #{position} in the queue "
+        f"and will be posted automatically when it's your turn.",
+        ephemeral=True
+    )
 
-def is_on_cooldown(guild_id: int) -> tuple[bool, Optional[int]]:
-    """Check if guild is on cooldown and return cooldown end time"""
-    if guild_id not in cooldown_data:
-        return False, None
+async def post_queued_raid(key: str):
+    """Post the head of a cooldown's queue, or reschedule it if the cooldown is still held"""
+    # A failed load raises to run_raid_queue, which retries; only a guild that really has no queue drops it
+    settings = await settings_cache.get(guild_of(key))
+    if not is_setup_complete(settings) or not settings.queue_size:
+        raid_queue.discard(key)
+        return
     
-    current_time = int(time.time())
-    end_time = cooldown_data[guild_id].get('end_time', 0)
+    raid = raid_queue.peek(key)
+    if raid is None:
+        return
+    channel = bot.get_channel(raid.channel_id)
+    if channel is None or raid.channel_id not in settings.channel_ids:
+        # Channel deleted or no longer allowed; move on to the next request
+        raid_queue.pop(key)
+        raid_queue.schedule(key, int(time.time()))
+        return
     
-    if current_time >= end_time:
-        # Cooldown expired, remove it
-        del cooldown_data[guild_id]
-        return False, None
+    claimed, end_time = await claim_cooldown(key, settings.cooldown_seconds)
+    if not claimed:
+        raid_queue.schedule(key, end_time)
+        return
     
-    return True, end_time
+    raid_queue.pop(key)
+    raid_queue.schedule(key, end_time)
+    announcement = get_announcement(channel.guild, settings)
+    await announcer.send(
+        channel,
+        format_raid_message(announcement, raid.message, raid.user_id, end_time),
+        allowed_mentions=announcement.allowed_mentions
+    )
+    RAIDS_POSTED.inc()
+    await record_raid(channel.guild.id, raid.user_id, raid.message)
 
-def set_cooldown(guild_id: int, duration: int):
-    """Set cooldown for a guild"""
-    end_time = int(time.time()) + duration
-    cooldown_data[guild_id] = {'end_time': end_time}
+async def run_raid_queue():
+    """Single scheduler for every queue: sleep until the earliest cooldown ends, then post"""
+    while True:
+        due_time = raid_queue.next_due()
+        timeout = None if due_time is None else max(0.0, due_time - time.time())
+        try:
+            await asyncio.wait_for(raid_queue_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        raid_queue_wakeup.clear()
+        
+        for key in raid_queue.pop_due(int(time.time())):
+            try:
+                await post_queued_raid(key)
+            except Exception as e:
+                print(f"Error posting queued raid for {key}: {e}")
+                raid_queue.schedule(key, int(time.time()) + QUEUE_RETRY_SECONDS)
 
-@bot.event
-async def on_ready():
-    """Bot ready event"""
-    load_settings()
-    print(f'{bot.user} has logged in and is ready!')
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    """Stable hash of the global command payload Discord would receive"""
+    payload = []
+    for command in tree.get_commands():
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:  # discord.py < 2.4 takes no tree argument
+            payload.append(command.to_dict())
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands_if_changed(tree: app_commands.CommandTree):
+    """Upload global commands only when they differ from the last synced tree"""
+    tree_hash = command_tree_hash(tree)
+    try:
+        synced_hash = await timed_storage('load_meta', storage.load_meta('command_tree_hash'))
+    except Exception as e:
+        print(f"Error loading command tree hash: {e}")
+        synced_hash = None
+    
+    if synced_hash == tree_hash and not os.getenv('FORCE_COMMAND_SYNC'):
+        print('Slash commands unchanged, skipping sync')
+        return
     
-    # Sync slash commands
     try:
-        synced = await bot.tree.sync()
+        synced = await tree.sync()
         print(f'Synced {len(synced)} command(s)')
+        await timed_storage('save_meta', storage.save_meta('command_tree_hash', tree_hash))
     except Exception as e:
         print(f'Failed to sync commands: {e}')
 
+startup_seconds: Optional[float] = None
+registry.gauge('raidrequest_startup_seconds', 'Process start to first on_ready', lambda: startup_seconds or 0)
+
+@bot.event
+async def on_ready():
+    """Bot ready event (fires again on every reconnect, so it does no heavy work)"""
+    global startup_seconds
+    if startup_seconds is None:
+        startup_seconds = time.perf_counter() - PROCESS_STARTED_AT
+        print(f'{bot.user} has logged in and is ready! (cold start {startup_seconds:.2f}s)')
+    else:
+        print(f'{bot.user} reconnected and is ready')
+    if shard_config.enabled:
+        print(f'Running shard(s) {sorted(bot.shards)} of {bot.shard_count}')
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    """Record handling time for every successful slash command (and let a drain finish)"""
+    observe_command(interaction, command, 'ok')
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    """Role renamed or permissions changed (including the bot's own roles)"""
+    invalidate_announcement(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    """Stop pinging a deleted role (and rebuild the mention prefix)"""
+    invalidate_announcement(role.guild.id)
+    settings = await get_guild_settings(role.guild.id)
+    if settings is not None and role.id in settings.role_ids:
+        kept = settings.without_role(role.id)
+        report_setup_cleared(role.guild.id, settings, kept)
+        save_guild_settings(role.guild.id, kept)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    """Stop allowing raid requests in a deleted channel"""
+    settings = await get_guild_settings(channel.guild.id)
+    if settings is not None and channel.id in settings.channel_ids:
+        kept = settings.without_channel(channel.id)
+        report_setup_cleared(channel.guild.id, settings, kept)
+        save_guild_settings(channel.guild.id, kept)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    """The bot left or was removed from a guild: delete its settings and raid history"""
+    write_compacted_settings(guild.id, None)
+    settings_cache.invalidate(guild.id)
+    forget_history(guild.id)
+    print(f"Removed from guild {guild.id}; deleting its settings")
+
 @bot.tree.command(name="setupraidreq", description="Initial setup for raid request system")
 @app_commands.describe(
     cooldown_minutes="Cooldown duration in minutes",
@@ -189,36 +889,15 @@ async def setup_raid_req(
     
     # Save settings
     guild_id = interaction.guild.id
-    guild_settings[guild_id] = {
-        'setup_complete': True,
-        'cooldown_seconds': cooldown_minutes * 60,
-        'allowed_channels': [channel.id],
-        'pinged_roles': roles
-    }
-    save_settings()
+    save_guild_settings(guild_id, GuildConfig(
+        setup_complete=True,
+        cooldown_seconds=cooldown_minutes * 60,
+        allowed_channels=[channel.id],
+        pinged_roles=roles
+    ))
     
     # Format role mentions for display with special handling for @everyone
-    role_mentions_list = []
-    
-    # Handle role1 (required)
-    if role1.name == "@everyone":
-        role_mentions_list.append("@everyone")
-    else:
-        role_mentions_list.append(f"<@&{role1.id}>")
-    
-    # Handle role2 (optional)
-    if role2:
-        if role2.name == "@everyone":
-            role_mentions_list.append("@everyone")
-        else:
-            role_mentions_list.append(f"<@&{role2.id}>")
-    
-    # Handle role3 (optional)
-    if role3:
-        if role3.name == "@everyone":
-            role_mentions_list.append("@everyone")
-        else:
-            role_mentions_list.append(f"<@&{role3.id}>")
+    role_mentions_list = [format_role_mention(role) for role in (role1, role2, role3) if role]
     
     role_mentions = ", ".join(role_mentions_list)
     
@@ -238,77 +917,87 @@ async def raid_request(interaction: discord.Interaction, message: str):
     """Main raid request command"""
     guild_id = interaction.guild.id
     
+    # Defer automatically if a cold settings load or a slow cooldown claim eats the 3 second window
+    announcer.arm(interaction)
+    
+    with span('settings'):
+        settings = await get_guild_settings(guild_id)
+    
     # Check if setup is complete
-    if not is_setup_complete(guild_id):
-        await interaction.response.send_message("The raid request system has not been set up yet. An administrator needs to run `/setupraidreq` first.", ephemeral=True)
+    if not is_setup_complete(settings):
+        RAID_REJECTIONS.inc(reason='not_setup')
+        await announcer.reply(interaction, "The raid request system has not been set up yet. An administrator needs to run `/setupraidreq` first.", ephemeral=True)
         return
     
-    settings = guild_settings[guild_id]
-    
     # Check if command is used in allowed channel
-    if interaction.channel.id not in settings['allowed_channels']:
-        channel_mentions = [f"<#{ch_id}>" for ch_id in settings['allowed_channels']]
-        await interaction.response.send_message(
-            f"This command can only be used in: {', '.join(channel_mentions)}",
+    if interaction.channel.id not in settings.channel_ids:
+        RAID_REJECTIONS.inc(reason='wrong_channel')
+        await announcer.reply(
+            interaction,
+            f"This command can only be used in: {settings.channel_mentions}",
             ephemeral=True
         )
         return
     
-    # Check cooldown
-    on_cooldown, end_time = is_on_cooldown(guild_id)
-    if on_cooldown:
-        await interaction.response.send_message(
+    # Check cooldown (guild-wide, or per channel/user depending on the configured scope)
+    key = request_cooldown_key(settings, interaction)
+    on_cooldown, end_time = is_on_cooldown(key)
+    if on_cooldown and not settings.queue_size:
+        RAID_REJECTIONS.inc(reason='cooldown')
+        await announcer.reply(
+            interaction,
             f"This command is on cooldown. Try again <t:{end_time}:R>.",
             ephemeral=True
         )
         return
     
     # Sanitize and validate message
-    sanitized_msg = sanitize_message(message)
+    with span('sanitize'):
+        sanitized_msg = sanitize_message(message)
     
     # Check word count
     word_count = len(sanitized_msg.split())
     if word_count > 20:
-        await interaction.response.send_message(
+        RAID_REJECTIONS.inc(reason='too_long')
+        await announcer.reply(
+            interaction,
             f"Your message is too long ({word_count} words). Please keep it to 20 words or less.",
             ephemeral=True
         )
         return
     
     if not sanitized_msg.strip():
-        await interaction.response.send_message("Your message cannot be empty after removing formatting and mentions.", ephemeral=True)
+        RAID_REJECTIONS.inc(reason='empty')
+        await announcer.reply(interaction, "Your message cannot be empty after removing formatting and mentions.", ephemeral=True)
         return
     
-    # Set cooldown BEFORE posting (to prevent race conditions)
-    set_cooldown(guild_id, settings['cooldown_seconds'])
-    
-    # Build role mentions with special handling for @everyone
-    role_mentions_list = []
-    for role_id in settings['pinged_roles']:
-        role = interaction.guild.get_role(role_id)
-        if role and role.name == "@everyone":
-            # Check if bot has permission to mention everyone
-            if interaction.guild.me.guild_permissions.mention_everyone:
-                role_mentions_list.append("@everyone")
-            else:
-                role_mentions_list.append("@everyone (no permission)")
-        else:
-            role_mentions_list.append(f"<@&{role_id}>")
-    
-    role_mentions = ' '.join(role_mentions_list)
+    # Queue valid requests made during the cooldown when the guild has a queue
+    if on_cooldown:
+        await queue_raid(interaction, key, settings, sanitized_msg, end_time)
+        return
     
-    # Calculate cooldown end time for display
-    cooldown_end = int(time.time()) + settings['cooldown_seconds']
+    # Claim cooldown BEFORE posting (first valid request wins, across all bot processes)
+    claimed, end_time = await claim_cooldown(key, settings.cooldown_seconds)
+    if not claimed and settings.queue_size:
+        await queue_raid(interaction, key, settings, sanitized_msg, end_time)
+        return
+    if not claimed:
+        RAID_REJECTIONS.inc(reason='cooldown_race')
+        await announcer.reply(
+            interaction,
+            f"This command is on cooldown. Try again <t:{end_time}:R>.",
+            ephemeral=True
+        )
+        return
     
-    # Create the raid message
-    raid_message = (
-        f"{role_mentions}\n"
-        f"> {sanitized_msg} - {interaction.user.mention}\n\n"
-        f"**Cooldown:** <t:{cooldown_end}:R>"
-    )
+    # Cached role mention prefix (rebuilt only after settings, role or permission changes)
+    announcement = get_announcement(interaction.guild, settings)
     
     # Send the public raid message
-    await interaction.response.send_message(raid_message)
+    raid_message = format_raid_message(announcement, sanitized_msg, interaction.user.id, end_time)
+    await announcer.reply(interaction, raid_message, allowed_mentions=announcement.allowed_mentions)
+    RAIDS_POSTED.inc()
+    await record_raid(guild_id, interaction.user.id, sanitized_msg)
 
 @bot.tree.command(name="editcooldown", description="Change the cooldown duration")
 @app_commands.describe(cooldown_minutes="New cooldown duration in minutes")
@@ -321,8 +1010,10 @@ async def edit_cooldown(interaction: discord.Interaction, cooldown_minutes: int)
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    settings = await get_guild_settings(guild_id)
+    
     # Check if setup is complete
-    if not is_setup_complete(guild_id):
+    if not is_setup_complete(settings):
         await interaction.response.send_message("Please run `/setupraidreq` first to set up the system.", ephemeral=True)
         return
     
@@ -332,8 +1023,7 @@ async def edit_cooldown(interaction: discord.Interaction, cooldown_minutes: int)
         return
     
     # Update settings
-    guild_settings[guild_id]['cooldown_seconds'] = cooldown_minutes * 60
-    save_settings()
+    save_guild_settings(guild_id, settings.with_cooldown(cooldown_minutes * 60))
     
     await interaction.response.send_message(
         f"✅ Cooldown updated to {cooldown_minutes} minutes. "
@@ -341,6 +1031,85 @@ async def edit_cooldown(interaction: discord.Interaction, cooldown_minutes: int)
         ephemeral=True
     )
 
+COOLDOWN_SCOPE_LABELS = {
+    SCOPE_GUILD: "server-wide",
+    SCOPE_CHANNEL: "per channel",
+    SCOPE_USER: "per user",
+}
+
+@bot.tree.command(name="editcooldownscope", description="Choose what the cooldown applies to")
+@app_commands.describe(scope="Share one cooldown across the server, or keep one per channel or per user")
+@app_commands.choices(scope=[
+    app_commands.Choice(name="Server-wide", value=SCOPE_GUILD),
+    app_commands.Choice(name="Per channel", value=SCOPE_CHANNEL),
+    app_commands.Choice(name="Per user", value=SCOPE_USER)
+])
+async def edit_cooldown_scope(interaction: discord.Interaction, scope: str):
+    """Edit the cooldown scope"""
+    guild_id = interaction.guild.id
+    
+    # Check if user has admin permissions
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    settings = await get_guild_settings(guild_id)
+    
+    # Check if setup is complete
+    if not is_setup_complete(settings):
+        await interaction.response.send_message("Please run `/setupraidreq` first to set up the system.", ephemeral=True)
+        return
+    
+    if scope not in COOLDOWN_SCOPES:
+        await interaction.response.send_message("Unknown cooldown scope.", ephemeral=True)
+        return
+    
+    # Update settings
+    save_guild_settings(guild_id, settings.with_cooldown_scope(scope))
+    
+    await interaction.response.send_message(
+        f"✅ Cooldown is now {COOLDOWN_SCOPE_LABELS[scope]}. "
+        f"Cooldowns that are already running are not affected.",
+        ephemeral=True
+    )
+
+@bot.tree.command(name="editqueue", description="Queue raid requests made during the cooldown")
+@app_commands.describe(size=f"How many requests may wait for the cooldown (0 turns the queue off, max {MAX_QUEUE_SIZE})")
+async def edit_queue(interaction: discord.Interaction, size: int):
+    """Edit the raid queue size"""
+    guild_id = interaction.guild.id
+    
+    # Check if user has admin permissions
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    settings = await get_guild_settings(guild_id)
+    
+    # Check if setup is complete
+    if not is_setup_complete(settings):
+        await interaction.response.send_message("Please run `/setupraidreq` first to set up the system.", ephemeral=True)
+        return
+    
+    # Validate input
+    if size < 0 or size > MAX_QUEUE_SIZE:
+        await interaction.response.send_message(f"Queue size must be between 0 and {MAX_QUEUE_SIZE}.", ephemeral=True)
+        return
+    
+    # Update settings
+    save_guild_settings(guild_id, settings.with_queue_size(size))
+    
+    if size:
+        await interaction.response.send_message(
+            f"✅ Up to {size} raid request(s) will now wait for the cooldown and be posted automatically.",
+            ephemeral=True
+        )
+    else:
+        await interaction.response.send_message(
+            "✅ Raid queue turned off. Requests during the cooldown will be rejected.",
+            ephemeral=True
+        )
+
 @bot.tree.command(name="editchannel", description="Update allowed channels")
 @app_commands.describe(
     action="Add or remove a channel",
@@ -359,29 +1128,31 @@ async def edit_channel(interaction: discord.Interaction, action: str, channel: d
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    settings = await get_guild_settings(guild_id)
+    
     # Check if setup is complete
-    if not is_setup_complete(guild_id):
+    if not is_setup_complete(settings):
         await interaction.response.send_message("Please run `/setupraidreq` first to set up the system.", ephemeral=True)
         return
     
-    settings = guild_settings[guild_id]
-    
     if action == "add":
-        if channel.id not in settings['allowed_channels']:
-            settings['allowed_channels'].append(channel.id)
-            save_settings()
+        if len(settings.allowed_channels) >= MAX_ALLOWED_CHANNELS and channel.id not in settings.channel_ids:
+            await interaction.response.send_message(f"You can configure at most {MAX_ALLOWED_CHANNELS} allowed channels.", ephemeral=True)
+            return
+        
+        if channel.id not in settings.channel_ids:
+            save_guild_settings(guild_id, settings.with_channel(channel.id))
             await interaction.response.send_message(f"Added {channel.mention} to allowed channels.", ephemeral=True)
         else:
             await interaction.response.send_message(f"{channel.mention} is already in the allowed channels list.", ephemeral=True)
     
     elif action == "remove":
-        if len(settings['allowed_channels']) <= 1:
+        if len(settings.allowed_channels) <= 1:
             await interaction.response.send_message("Cannot remove the last allowed channel. At least one channel must be configured.", ephemeral=True)
             return
         
-        if channel.id in settings['allowed_channels']:
-            settings['allowed_channels'].remove(channel.id)
-            save_settings()
+        if channel.id in settings.channel_ids:
+            save_guild_settings(guild_id, settings.without_channel(channel.id))
             await interaction.response.send_message(f"Removed {channel.mention} from allowed channels.", ephemeral=True)
         else:
             await interaction.response.send_message(f"{channel.mention} is not in the allowed channels list.", ephemeral=True)
@@ -404,32 +1175,34 @@ async def edit_pinged_role(interaction: discord.Interaction, action: str, role:
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    settings = await get_guild_settings(guild_id)
+    
     # Check if setup is complete
-    if not is_setup_complete(guild_id):
+    if not is_setup_complete(settings):
         await interaction.response.send_message("Please run `/setupraidreq` first to set up the system.", ephemeral=True)
         return
     
-    settings = guild_settings[guild_id]
-    
     # Get proper role display name
-    role_display = "@everyone" if role.name == "@everyone" else role.mention
+    role_display = format_role_mention(role)
     
     if action == "add":
-        if role.id not in settings['pinged_roles']:
-            settings['pinged_roles'].append(role.id)
-            save_settings()
+        if len(settings.pinged_roles) >= MAX_PINGED_ROLES and role.id not in settings.role_ids:
+            await interaction.response.send_message(f"You can configure at most {MAX_PINGED_ROLES} pinged roles.", ephemeral=True)
+            return
+        
+        if role.id not in settings.role_ids:
+            save_guild_settings(guild_id, settings.with_role(role.id))
             await interaction.response.send_message(f"Added {role_display} to pinged roles.", ephemeral=True)
         else:
             await interaction.response.send_message(f"{role_display} is already in the pinged roles list.", ephemeral=True)
     
     elif action == "remove":
-        if len(settings['pinged_roles']) <= 1:
+        if len(settings.pinged_roles) <= 1:
             await interaction.response.send_message("Cannot remove the last pinged role. At least one role must be configured.", ephemeral=True)
             return
         
-        if role.id in settings['pinged_roles']:
-            settings['pinged_roles'].remove(role.id)
-            save_settings()
+        if role.id in settings.role_ids:
+            save_guild_settings(guild_id, settings.without_role(role.id))
             await interaction.response.send_message(f"Removed {role_display} from pinged roles.", ephemeral=True)
         else:
             await interaction.response.send_message(f"{role_display} is not in the pinged roles list.", ephemeral=True)
@@ -444,18 +1217,18 @@ async def view_settings(interaction: discord.Interaction):
         await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
         return
     
+    settings = await get_guild_settings(guild_id)
+    
     # Check if setup is complete
-    if not is_setup_complete(guild_id):
+    if not is_setup_complete(settings):
         await interaction.response.send_message("The raid request system has not been set up yet. Run `/setupraidreq` first.", ephemeral=True)
         return
     
-    settings = guild_settings[guild_id]
-    
     # Format settings for display
-    cooldown_minutes = settings['cooldown_seconds'] // 60
+    cooldown_minutes = settings.cooldown_seconds // 60
     
     channel_mentions = []
-    for ch_id in settings['allowed_channels']:
+    for ch_id in settings.allowed_channels:
         channel = interaction.guild.get_channel(ch_id)
         if channel:
             channel_mentions.append(channel.mention)
@@ -463,18 +1236,16 @@ async def view_settings(interaction: discord.Interaction):
             channel_mentions.append(f"<#{ch_id}> (deleted)")
     
     role_mentions = []
-    for role_id in settings['pinged_roles']:
+    for role_id in settings.pinged_roles:
         role = interaction.guild.get_role(role_id)
         if role:
-            if role.name == "@everyone":
-                role_mentions.append("@everyone")
-            else:
-                role_mentions.append(role.mention)
+            role_mentions.append(format_role_mention(role))
         else:
             role_mentions.append(f"<@&{role_id}> (deleted)")
     
     # Check current cooldown status
-    on_cooldown, end_time = is_on_cooldown(guild_id)
+    key = request_cooldown_key(settings, interaction)
+    on_cooldown, end_time = is_on_cooldown(key)
     cooldown_status = f"<t:{end_time}:R>" if on_cooldown else "Not active"
     
     embed = discord.Embed(
@@ -485,7 +1256,7 @@ async def view_settings(interaction: discord.Interaction):
     
     embed.add_field(
         name="⏰ Cooldown Duration",
-        value=f"{cooldown_minutes} minutes",
+        value=f"{cooldown_minutes} minutes ({COOLDOWN_SCOPE_LABELS[settings.cooldown_scope]})",
         inline=True
     )
     
@@ -507,28 +1278,101 @@ async def view_settings(interaction: discord.Interaction):
         inline=False
     )
     
+    embed.add_field(
+        name="📋 Raid Queue",
+        value=f"{raid_queue.length(key)}/{settings.queue_size} waiting" if settings.queue_size else "Off",
+        inline=False
+    )
+    
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+@bot.tree.command(name="raidstats", description="Show how often raids are requested")
+async def raid_stats(interaction: discord.Interaction):
+    """Raid counts, peak hours and average time between raids from the guild's history"""
+    guild_id = interaction.guild.id
+    
+    # Check if user has admin permissions
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("You need administrator permissions to use this command.", ephemeral=True)
+        return
+    
+    try:
+        history = await history_cache.get(guild_id)
+    except Exception as e:
+        print(f"Error loading raid history for guild {guild_id}: {e}")
+        await interaction.response.send_message("Raid history is unavailable right now, please try again later.", ephemeral=True)
+        return
+    
+    if not history.total:
+        await interaction.response.send_message("No raids have been posted yet.", ephemeral=True)
+        return
+    
+    now = int(time.time())
+    average_gap = history.average_gap()
+    peak_hours = ", ".join(f"{hour:02d}:00 ({count})" for hour, count in history.peak_hours())
+    
+    embed = discord.Embed(
+        title="📊 Raid Request Stats",
+        color=discord.Color.blue(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    embed.add_field(
+        name="📈 Raids Posted",
+        value=(
+            f"Today: {history.count_since(now, 1)}\n"
+            f"Last 7 days: {history.count_since(now, 7)}\n"
+            f"Last 30 days: {history.count_since(now, 30)}\n"
+            f"All time: {history.total}"
+        ),
+        inline=True
+    )
+    
+    embed.add_field(
+        name="🕒 Peak Hours (UTC)",
+        value=peak_hours,
+        inline=True
+    )
+    
+    embed.add_field(
+        name="⏱️ Average Time Between Raids",
+        value=f"{average_gap / 60:.1f} minutes" if average_gap is not None else "Not enough raids yet",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="🕓 Last Raid",
+        value=f"<t:{history.last_at}:R>",
+        inline=False
+    )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
-# --- Flask web server for Render port binding ---
-import threading
-from flask import Flask
-
-def run_web():
-    app = Flask(__name__)
-
-    @app.route("/")
-    def home():
-        return "RaidRequest bot is running!"
+@bot.tree.command(name="profile", description="Profile the bot for a few seconds (bot owner only)")
+@app_commands.describe(seconds=f"How long to capture for (1-{MAX_PROFILE_SECONDS} seconds)")
+async def profile(interaction: discord.Interaction, seconds: int = 10):
+    """Capture a cProfile/yappi profile of everything this process does"""
+    # Check if user owns the bot (a profile covers every guild, so server admins are not enough)
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can profile the bot.", ephemeral=True)
+        return
+    
+    # Validate input
+    if not 1 <= seconds <= MAX_PROFILE_SECONDS:
+        await interaction.response.send_message(f"Profile for 1 to {MAX_PROFILE_SECONDS} seconds.", ephemeral=True)
+        return
+    
+    if profiler.running:
+        await interaction.response.send_message("A profile is already being captured.", ephemeral=True)
+        return
+    
+    await interaction.response.send_message(f"⏱️ Profiling with {profiler.engine} for {seconds} seconds...", ephemeral=True)
+    path, summary = await profiler.capture(seconds)
+    print(f"Saved profile to {path}")
+    await interaction.followup.send(f"✅ Saved `{path}`\n```\n{summary[:1800]}\n```", ephemeral=True)
 
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
 
 if __name__ == "__main__":
-    # Start Flask web server in a separate thread
-    web_thread = threading.Thread(target=run_web, daemon=True)
-    web_thread.start()
-
     # Get bot token from environment variable or use placeholder
     token = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN')
     if token == 'YOUR_BOT_TOKEN':
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Bulk export, import and migration of guild settings
+
+Settings are streamed in chunks between any two storage backends or a JSONL file
+with one {"guild_id": ..., "settings": {...}} object per line. Reads use
+Storage.list_keys/load_key_range (a shallow key listing plus one range query per
+chunk on Firebase) and writes use one save_keys batch per chunk, with several chunks in
+flight at once.
+
+Usage:
+    python bulk.py export --from firebase --file settings.jsonl
+    python bulk.py import --to sqlite --file settings.jsonl
+    python bulk.py migrate --from firebase --to log
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from storage import SETTINGS_TABLE, Storage, create_storage
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass  # dotenv is optional
+
+Chunk = Dict[str, Dict]
+
+
+class Progress:
+    """Single-line progress report with throughput"""
+
+    def __init__(self, verb: str, total: Optional[int] = None):
+        self.verb = verb
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+
+    def add(self, count: int):
+        self.done += count
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0
+        of_total = f"/{self.total}" if self.total is not None else ""
+        print(f"\r📦 {self.verb} {self.done}{of_total} guilds ({rate:,.0f}/s)", end='', flush=True)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        print(f"\r✅ {self.verb} {self.done} guilds in {elapsed:.2f}s" + " " * 20)
+
+
+async def store_chunks(source: Storage, chunk_size: int, concurrency: int,
+                       progress: Progress) -> AsyncIterator[Chunk]:
+    """Yield a store's settings chunk by chunk, fetching several chunks concurrently"""
+    keys = sorted(await source.list_keys(SETTINGS_TABLE))
+    progress.total = len(keys)
+    chunks = [keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size)]
+    # Fetch a window of chunks at once and yield them in key order
+    for start in range(0, len(chunks), concurrency):
+        window = chunks[start:start + concurrency]
+        for rows in await asyncio.gather(*(source.load_key_range(SETTINGS_TABLE, chunk) for chunk in window)):
+            yield rows
+
+
+async def file_chunks(path: str, chunk_size: int) -> AsyncIterator[Chunk]:
+    """Yield settings from a JSONL export chunk by chunk, skipping blank lines"""
+    chunk: Chunk = {}
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                chunk[str(int(record['guild_id']))] = record['settings']
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_number}: not a guild settings record ({e})")
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = {}
+    if chunk:
+        yield chunk
+
+
+async def write_chunks(chunks: AsyncIterator[Chunk], write: Callable[[Chunk], Awaitable[None]],
+                       concurrency: int, progress: Progress):
+    """Hand each chunk to write, with at most concurrency writes in flight"""
+    in_flight = set()
+
+    async def run(rows: Chunk):
+        await write(rows)
+        progress.add(len(rows))
+
+    async for rows in chunks:
+        if len(in_flight) >= concurrency:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # re-raise a failed write
+        in_flight.add(asyncio.create_task(run(rows)))
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    progress.finish()
+
+
+async def export_settings(source: Storage, path: str, chunk_size: int, concurrency: int):
+    """Write every guild's settings to a JSONL file"""
+    progress = Progress('Exported')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        async def write(rows: Chunk):
+            f.write(''.join(
+                json.dumps({'guild_id': key, 'settings': value}) + '\n' for key, value in rows.items()
+            ))
+
+        # One writer, so lines stay in key order
+        await write_chunks(store_chunks(source, chunk_size, concurrency, progress), write, 1, progress)
+    os.replace(tmp_path, path)
+
+
+async def import_settings(target: Storage, path: str, chunk_size: int, concurrency: int):
+    """Upsert every guild in a JSONL file into a store"""
+    progress = Progress('Imported')
+
+    async def write(rows: Chunk):
+        await target.save_keys(SETTINGS_TABLE, rows)
+
+    await write_chunks(file_chunks(path, chunk_size), write, concurrency, progress)
+
+
+async def migrate_settings(source: Storage, target: Storage, chunk_size: int, concurrency: int):
+    """Copy every guild's settings from one store into another"""
+    progress = Progress('Migrated')
+
+    async def write(rows: Chunk):
+        await target.save_keys(SETTINGS_TABLE, rows)
+
+    await write_chunks(store_chunks(source, chunk_size, concurrency, progress), write, concurrency, progress)
+
+
+async def run(args) -> int:
+    stores: List[Storage] = []
+    try:
+        if args.command == 'export':
+            stores.append(create_storage(args.source, args.source_path))
+            await export_settings(stores[0], args.file, args.chunk_size, args.concurrency)
+        elif args.command == 'import':
+            stores.append(create_storage(args.target, args.target_path))
+            await import_settings(stores[0], args.file, args.chunk_size, args.concurrency)
+        else:
+            stores.append(create_storage(args.source, args.source_path))
+            stores.append(create_storage(args.target, args.target_path))
+            await migrate_settings(stores[0], stores[1], args.chunk_size, args.concurrency)
+    finally:
+        for store in stores:
+            await store.close()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk export, import and migrate guild settings")
+    parser.add_argument("command", choices=["export", "import", "migrate"])
+    parser.add_argument("--from", dest="source", help="Backend to read (default: STORAGE_BACKEND)")
+    parser.add_argument("--to", dest="target", help="Backend to write (default: STORAGE_BACKEND)")
+    parser.add_argument("--from-path", dest="source_path", help="File for a sqlite/log source (default: STORAGE_PATH)")
+    parser.add_argument("--to-path", dest="target_path", help="File for a sqlite/log target (default: STORAGE_PATH)")
+    parser.add_argument("--file", default="guild_settings.jsonl", help="JSONL file to export to or import from")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Guilds per read/write batch")
+    parser.add_argument("--concurrency", type=int, default=8, help="Batches in flight at once")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1 or args.concurrency < 1:
+        parser.error("--chunk-size and --concurrency must be at least 1")
+    if args.command == 'migrate' and (args.source or '') == (args.target or '') \
+            and args.source_path == args.target_path:
+        parser.error("migrate needs different --from/--to backends or paths")
+
+    try:
+        return asyncio.run(run(args))
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
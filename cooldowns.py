@@ -0,0 +1,98 @@
+"""
+Scoped cooldown tracking with a hashed timer wheel for O(1) insert and expiry
+
+A cooldown key is the guild id for guild-wide cooldowns, or the guild id plus a
+channel or user id for narrower scopes (see cooldown_key). Keys double as the
+storage keys in the "cooldowns" table, so guild-scope keys stay plain guild ids.
+"""
+
+from typing import Dict, List, Optional, Set
+
+SCOPE_GUILD = 'guild'
+SCOPE_CHANNEL = 'channel'
+SCOPE_USER = 'user'
+COOLDOWN_SCOPES = (SCOPE_GUILD, SCOPE_CHANNEL, SCOPE_USER)
+
+
+def cooldown_key(scope: str, guild_id: int, channel_id: int, user_id: int) -> str:
+    """Key shared by every request that should wait on the same cooldown"""
+    if scope == SCOPE_CHANNEL:
+        return f"{guild_id}:c{channel_id}"
+    if scope == SCOPE_USER:
+        return f"{guild_id}:u{user_id}"
+    return str(guild_id)
+
+
+def guild_of(key: str) -> int:
+    """Guild id a cooldown key belongs to"""
+    return int(key.split(':', 1)[0])
+
+
+class CooldownTracker:
+    """Active cooldown end times, bucketed by end second on a timer wheel
+
+    Each key sits in the slot for end_time % slots. Entries further out than one
+    revolution share slots with nearer ones and are simply left in place when a
+    sweep passes over them early.
+    """
+
+    def __init__(self, slots: int = 3600):
+        self.slots = slots
+        self._end_times: Dict[str, int] = {}
+        self._wheel: Dict[int, Set[str]] = {}
+        self._swept_until: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._end_times)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._end_times
+
+    def items(self):
+        """Iterate (key, end_time) pairs, including ones not yet swept"""
+        return self._end_times.items()
+
+    def get(self, key: str, now: int) -> Optional[int]:
+        """Return the key's end time if its cooldown is still running"""
+        end_time = self._end_times.get(key)
+        if end_time is None or now >= end_time:
+            return None
+        return end_time
+
+    def set(self, key: str, end_time: int):
+        """Start (or replace) a cooldown"""
+        self.clear(key)
+        self._end_times[key] = end_time
+        self._wheel.setdefault(end_time % self.slots, set()).add(key)
+
+    def clear(self, key: str):
+        """Forget a cooldown"""
+        end_time = self._end_times.pop(key, None)
+        if end_time is not None:
+            slot = self._wheel.get(end_time % self.slots)
+            if slot is not None:
+                slot.discard(key)
+                if not slot:
+                    del self._wheel[end_time % self.slots]
+
+    def sweep(self, now: int) -> List[str]:
+        """Remove every cooldown that has ended and return the expired keys"""
+        if self._swept_until is None or now - self._swept_until >= self.slots:
+            # First sweep, or we fell a full revolution behind: visit every slot
+            seconds = range(now - self.slots + 1, now + 1)
+        else:
+            seconds = range(self._swept_until + 1, now + 1)
+        self._swept_until = now
+
+        expired = []
+        for second in seconds:
+            slot = self._wheel.get(second % self.slots)
+            if not slot:
+                continue
+            for key in [key for key in slot if self._end_times[key] <= now]:
+                slot.discard(key)
+                del self._end_times[key]
+                expired.append(key)
+            if not slot:
+                del self._wheel[second % self.slots]
+        return expired
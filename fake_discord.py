@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for Discord
+
+FakeDiscord answers the REST routes the announce pipeline uses (interaction
+callbacks, followup webhooks and channel message posts) and can add latency and
+inject 429 responses with Discord's rate limit headers, so rate limit handling
+can be exercised without touching Discord. Point the bot at it with
+DISCORD_API_BASE=http://127.0.0.1:8787/api/v10.
+
+The Fake* classes below it are in-process stand-ins for interactions, guilds
+and channels, for calling command callbacks directly (benchmark.py, loadtest.py).
+
+Usage:
+    python fake_discord.py --port 8787 --latency 0.05 --rate-limit-every 10
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {'id': '1', 'username': 'RaidRequest', 'discriminator': '0000', 'avatar': None, 'bot': True}
+
+
+class FakeDiscord:
+    """aiohttp app recording every request it answers"""
+
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: float = 1.0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests: List[Dict] = []
+        self.rate_limited = 0
+        self._counter = itertools.count(1)
+        self._ids = itertools.count(int(time.time() * 1000) << 22)
+        self.app = web.Application()
+        self.app.router.add_post('/api/v10/interactions/{interaction_id}/{token}/callback', self.callback)
+        self.app.router.add_post('/api/v10/webhooks/{application_id}/{token}', self.followup)
+        self.app.router.add_route('*', '/api/v10/webhooks/{application_id}/{token}/messages/{message_id}', self.original)
+        self.app.router.add_post('/api/v10/channels/{channel_id}/messages', self.channel_message)
+        self._runner: Optional[web.AppRunner] = None
+
+    def message(self, channel_id: str, content: str) -> Dict:
+        """Minimal message object discord.py can parse"""
+        return {
+            'id': str(next(self._ids)), 'channel_id': channel_id, 'author': BOT_USER, 'content': content,
+            'timestamp': datetime.now(timezone.utc).isoformat(), 'edited_timestamp': None, 'tts': False,
+            'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [], 'embeds': [],
+            'pinned': False, 'type': 0, 'flags': 0,
+        }
+
+    async def _answer(self, request: web.Request, route: str) -> Optional[web.Response]:
+        """Record the request, then sleep or return a 429 if configured to"""
+        try:
+            payload = await request.json() if request.can_read_body else None
+        except ValueError:
+            payload = None  # multipart uploads are not inspected
+        self.requests.append({'route': route, 'method': request.method, 'path': request.path, 'json': payload})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and next(self._counter) % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return web.json_response(
+                {'message': 'You are being rate limited.', 'retry_after': self.retry_after, 'global': False},
+                status=429,
+                headers={
+                    'Retry-After': str(self.retry_after), 'X-RateLimit-Limit': '5', 'X-RateLimit-Remaining': '0',
+                    'X-RateLimit-Reset-After': str(self.retry_after), 'X-RateLimit-Bucket': route,
+                    'X-RateLimit-Scope': 'user',
+                }
+            )
+        return None
+
+    async def callback(self, request: web.Request) -> web.Response:
+        limited = await self._answer(request, 'interaction_callback')
+        return limited or web.Response(status=204)
+
+    async def followup(self, request: web.Request) -> web.Response:
+        limited = await self._answer(request, 'webhook')
+        if limited:
+            return limited
+        body = self.requests[-1]['json'] or {}
+        return web.json_response(self.message('0', body.get('content', '')))
+
+    async def original(self, request: web.Request) -> web.Response:
+        limited = await self._answer(request, 'webhook_message')
+        if limited:
+            return limited
+        if request.method == 'DELETE':
+            return web.Response(status=204)
+        body = self.requests[-1]['json'] or {}
+        return web.json_response(self.message('0', body.get('content', '')))
+
+    async def channel_message(self, request: web.Request) -> web.Response:
+        limited = await self._answer(request, f"channel:{request.match_info['channel_id']}")
+        if limited:
+            return limited
+        body = self.requests[-1]['json'] or {}
+        return web.json_response(self.message(request.match_info['channel_id'], body.get('content', '')))
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8787):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# In-process fakes: just enough of discord.Interaction and friends for the command handlers
+
+class FakePermissions:
+    def __init__(self, mention_everyone=True, administrator=True):
+        self.mention_everyone = mention_everyone
+        self.administrator = administrator
+
+
+class FakeRole:
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+        self.mention = f"<@&{role_id}>"
+
+
+class FakeMember:
+    def __init__(self, user_id, administrator=True):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+        self.guild_permissions = FakePermissions(administrator=administrator)
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild=None):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, role_ids=()):
+        self.id = guild_id
+        self.me = FakeMember(1)
+        self._roles = {role_id: FakeRole(role_id, f"role-{role_id}") for role_id in role_ids}
+        self._roles[guild_id] = FakeRole(guild_id, "@everyone")
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_channel(self, channel_id):
+        return FakeChannel(channel_id, self)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.sent = []
+        self.deferred = False
+
+    async def send_message(self, content=None, **kwargs):
+        self.sent.append(content)
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+    def is_done(self):
+        return self.deferred or bool(self.sent)
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+INTERACTION_IDS = itertools.count(1)
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for the command handlers"""
+
+    def __init__(self, guild, channel_id, user_id=42, administrator=True):
+        self.id = next(INTERACTION_IDS)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = FakeChannel(channel_id, guild)
+        self.channel_id = channel_id
+        self.user = FakeMember(user_id, administrator)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.command = None
+        self.created_at = datetime.now(timezone.utc)
+        self.extras = {}
+
+    async def delete_original_response(self):
+        pass
+
+    @property
+    def replies(self):
+        """Everything sent back for this interaction, in order"""
+        return self.response.sent + self.followup.sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Discord REST API for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry_after for injected 429s")
+    args = parser.parse_args()
+
+    fake = FakeDiscord(args.latency, args.rate_limit_every, args.retry_after)
+    web.run_app(fake.app, host=args.host, port=args.port, access_log=None,
+                print=lambda _: print(f"Fake Discord API on http://{args.host}:{args.port}/api/v10"))
+
+
+if __name__ == "__main__":
+    main()
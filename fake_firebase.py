@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Firebase Realtime Database REST API
+
+Implements the parts FirebaseStorage uses: GET (with shallow=true and
+orderBy="$key" range queries), PUT and DELETE (with ETag / if-match conditional
+writes) and multi-path PATCH, all on an in-memory JSON tree, plus REST streaming:
+a GET with Accept: text/event-stream gets the current value as a put event and
+then a put/patch event for every write under the path. Requests can be slowed
+down with a fixed latency. Point the bot at it with
+FIREBASE_URL=http://127.0.0.1:8788 and any FIREBASE_SECRET.
+
+Usage:
+    python fake_firebase.py --port 8788 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+def _etag(value: Any) -> str:
+    return hashlib.md5(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _parts(path: str) -> List[str]:
+    return [part for part in path.strip('/').split('/') if part]
+
+
+def _event(event: str, path: str, data: Any) -> bytes:
+    """One server-sent event in Firebase's format"""
+    return f"event: {event}\ndata: {json.dumps({'path': path, 'data': data})}\n\n".encode()
+
+
+class FakeFirebase:
+    """aiohttp app serving an in-memory Firebase tree"""
+
+    def __init__(self, latency: float = 0.0, secret: Optional[str] = None, data: Optional[Dict] = None,
+                 keepalive: float = 30.0):
+        self.latency = latency
+        self.secret = secret
+        self.keepalive = keepalive
+        self.root: Dict[str, Any] = data if data is not None else {}
+        self.requests: Counter = Counter()
+        # (path parts, queue of encoded events; None closes the stream) per open stream
+        self.listeners: List[Tuple[List[str], asyncio.Queue]] = []
+        self.app = web.Application()
+        self.app.router.add_route('*', '/{path:.*}.json', self.handle)
+        self._runner: Optional[web.AppRunner] = None
+
+    # Tree access
+
+    def get(self, path: str) -> Any:
+        node = self.root
+        for part in _parts(path):
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def set(self, path: str, value: Any):
+        """Write (or delete, for None) a node, pruning parents left empty"""
+        parts = _parts(path)
+        if not parts:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node, parents = self.root, []
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[part] = {}
+            parents.append((node, part))
+            node = child
+        if value is None or value == {}:
+            node.pop(parts[-1], None)
+            for parent, part in reversed(parents):
+                if parent[part]:
+                    break
+                del parent[part]
+        else:
+            node[parts[-1]] = value
+
+    def query(self, value: Any, params) -> Any:
+        """Apply shallow and orderBy="$key" filters to a GET result"""
+        if not isinstance(value, dict):
+            return value
+        if params.get('orderBy') == '"$key"':
+            keys = sorted(value)
+            if 'startAt' in params:
+                keys = [key for key in keys if key >= json.loads(params['startAt'])]
+            if 'endAt' in params:
+                keys = [key for key in keys if key <= json.loads(params['endAt'])]
+            if 'limitToFirst' in params:
+                keys = keys[:int(params['limitToFirst'])]
+            value = {key: value[key] for key in keys}
+        if params.get('shallow') == 'true':
+            return {key: True for key in value}
+        return value
+
+    # Streaming
+
+    def publish(self, event: str, path: str, data: Any):
+        """Tell every stream that covers path about a write there"""
+        written = _parts(path)
+        for listening, queue in self.listeners:
+            if written[:len(listening)] == listening:
+                queue.put_nowait(_event(event, '/' + '/'.join(written[len(listening):]), data))
+            elif listening[:len(written)] == written:
+                # A write above the stream's path: resend its whole value
+                queue.put_nowait(_event('put', '/', self.get('/'.join(listening))))
+
+    def drop_streams(self):
+        """Close every open stream, as a server restart or network blip would"""
+        for _, queue in self.listeners:
+            queue.put_nowait(None)
+
+    async def stream(self, request: web.Request, path: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        listener = (_parts(path), asyncio.Queue())
+        self.listeners.append(listener)
+        try:
+            await response.write(_event('put', '/', self.get(path)))
+            while True:
+                try:
+                    message = await asyncio.wait_for(listener[1].get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    message = b"event: keep-alive\ndata: null\n\n"
+                if message is None:
+                    break
+                await response.write(message)
+        except ConnectionError:
+            pass  # the client went away
+        finally:
+            self.listeners.remove(listener)
+        return response
+
+    # HTTP
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests[request.method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.secret is not None and request.query.get('auth') != self.secret:
+            return web.json_response({'error': 'Permission denied'}, status=401)
+
+        path = request.match_info['path']
+        if request.method == 'GET' and request.headers.get('Accept') == 'text/event-stream':
+            return await self.stream(request, path)
+        if request.method == 'GET':
+            value = self.get(path)
+            headers = {'ETag': _etag(value)} if request.headers.get('X-Firebase-ETag') == 'true' else {}
+            return web.json_response(self.query(value, request.query), headers=headers)
+        if request.method in ('PUT', 'DELETE'):
+            expected = request.headers.get('if-match')
+            if expected is not None:
+                current = self.get(path)
+                if expected != _etag(current):
+                    return web.json_response(current, status=412, headers={'ETag': _etag(current)})
+        if request.method == 'PUT':
+            body = await request.text()
+            if not body:
+                # Like Firebase: a PUT needs a JSON body (deletes go through DELETE)
+                return web.json_response({'error': 'No data supplied.'}, status=400)
+            value = json.loads(body)
+            self.set(path, value)
+            self.publish('put', path, value)
+            return web.json_response(value, headers={'ETag': _etag(value)})
+        if request.method == 'PATCH':
+            changes = await request.json()
+            for key, value in changes.items():
+                self.set(f"{path}/{key}", value)
+            self.publish('patch', path, changes)
+            return web.json_response(changes)
+        if request.method == 'DELETE':
+            self.set(path, None)
+            self.publish('put', path, None)
+            return web.json_response(None)
+        return web.json_response({'error': 'Method not allowed'}, status=405)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8788):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        self.drop_streams()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Firebase Realtime Database for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--secret", help="Require this auth parameter")
+    parser.add_argument("--data", help="JSON file to load as the initial tree")
+    args = parser.parse_args()
+
+    data = None
+    if args.data:
+        with open(args.data, encoding='utf-8') as f:
+            data = json.load(f)
+    fake = FakeFirebase(args.latency, args.secret, data)
+    web.run_app(fake.app, host=args.host, port=args.port, access_log=None,
+                print=lambda _: print(f"Fake Firebase on http://{args.host}:{args.port}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+In-memory guild configuration built from (and serialized back to) the stored settings JSON
+"""
+
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from cooldowns import COOLDOWN_SCOPES, SCOPE_GUILD
+from raid_queue import MAX_QUEUE_SIZE
+
+MAX_ALLOWED_CHANNELS = 25
+MAX_PINGED_ROLES = 10
+
+
+class GuildConfig:
+    """Immutable per-guild settings; edits return a new object
+
+    Channels and roles keep their configured order in tuples (for display and the
+    mention prefix) and are mirrored in frozensets for O(1) membership checks.
+    """
+    __slots__ = (
+        'setup_complete', 'cooldown_seconds', 'allowed_channels', 'pinged_roles', 'cooldown_scope',
+        'queue_size',
+        'channel_ids', 'role_ids', '_channel_mentions'
+    )
+
+    def __init__(self, setup_complete: bool, cooldown_seconds: int,
+                 allowed_channels: Iterable[int], pinged_roles: Iterable[int],
+                 cooldown_scope: str = SCOPE_GUILD, queue_size: int = 0):
+        self.setup_complete = setup_complete
+        self.cooldown_seconds = cooldown_seconds
+        self.cooldown_scope = cooldown_scope if cooldown_scope in COOLDOWN_SCOPES else SCOPE_GUILD
+        self.queue_size = max(0, min(queue_size, MAX_QUEUE_SIZE))
+        self.allowed_channels: Tuple[int, ...] = tuple(dict.fromkeys(allowed_channels))
+        self.pinged_roles: Tuple[int, ...] = tuple(dict.fromkeys(pinged_roles))
+        self.channel_ids = frozenset(self.allowed_channels)
+        self.role_ids = frozenset(self.pinged_roles)
+        self._channel_mentions: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'GuildConfig':
+        """Build from the stored JSON form"""
+        return cls(
+            bool(data.get('setup_complete', False)),
+            int(data.get('cooldown_seconds', 0)),
+            (int(ch_id) for ch_id in data.get('allowed_channels') or ()),
+            (int(role_id) for role_id in data.get('pinged_roles') or ()),
+            data.get('cooldown_scope', SCOPE_GUILD),
+            int(data.get('queue_size', 0)),
+        )
+
+    def to_dict(self) -> Dict:
+        """Serialize to the stored JSON form"""
+        data = {
+            'setup_complete': self.setup_complete,
+            'cooldown_seconds': self.cooldown_seconds,
+            'allowed_channels': list(self.allowed_channels),
+            'pinged_roles': list(self.pinged_roles),
+        }
+        if self.cooldown_scope != SCOPE_GUILD:
+            data['cooldown_scope'] = self.cooldown_scope
+        if self.queue_size:
+            data['queue_size'] = self.queue_size
+        return data
+
+    @property
+    def channel_mentions(self) -> str:
+        """Comma-separated allowed channel mentions, built once"""
+        if self._channel_mentions is None:
+            self._channel_mentions = ', '.join(f"<#{ch_id}>" for ch_id in self.allowed_channels)
+        return self._channel_mentions
+
+    def _replace(self, **changes) -> 'GuildConfig':
+        fields = {
+            'setup_complete': self.setup_complete,
+            'cooldown_seconds': self.cooldown_seconds,
+            'allowed_channels': self.allowed_channels,
+            'pinged_roles': self.pinged_roles,
+            'cooldown_scope': self.cooldown_scope,
+            'queue_size': self.queue_size,
+        }
+        fields.update(changes)
+        return GuildConfig(**fields)
+
+    def with_cooldown(self, cooldown_seconds: int) -> 'GuildConfig':
+        return self._replace(cooldown_seconds=cooldown_seconds)
+
+    def with_cooldown_scope(self, cooldown_scope: str) -> 'GuildConfig':
+        return self._replace(cooldown_scope=cooldown_scope)
+
+    def with_queue_size(self, queue_size: int) -> 'GuildConfig':
+        return self._replace(queue_size=queue_size)
+
+    def with_channel(self, channel_id: int) -> 'GuildConfig':
+        return self._replace(allowed_channels=self.allowed_channels + (channel_id,))
+
+    def without_channel(self, channel_id: int) -> 'GuildConfig':
+        return self._keeping(tuple(ch for ch in self.allowed_channels if ch != channel_id), self.pinged_roles)
+
+    def with_role(self, role_id: int) -> 'GuildConfig':
+        return self._replace(pinged_roles=self.pinged_roles + (role_id,))
+
+    def without_role(self, role_id: int) -> 'GuildConfig':
+        return self._keeping(self.allowed_channels, tuple(role for role in self.pinged_roles if role != role_id))
+
+    def pruned(self, channel_exists: Callable[[int], bool], role_exists: Callable[[int], bool]) -> 'GuildConfig':
+        """Drop deleted channels and roles; returns self when nothing was dropped"""
+        channels = tuple(ch for ch in self.allowed_channels if channel_exists(ch))
+        roles = tuple(role for role in self.pinged_roles if role_exists(role))
+        if len(channels) == len(self.allowed_channels) and len(roles) == len(self.pinged_roles):
+            return self
+        return self._keeping(channels, roles)
+
+    def _keeping(self, channels: Tuple[int, ...], roles: Tuple[int, ...]) -> 'GuildConfig':
+        # Setup needs a channel and a role; losing the last one sends the guild back to /setupraidreq
+        return self._replace(
+            allowed_channels=channels, pinged_roles=roles,
+            setup_complete=self.setup_complete and bool(channels) and bool(roles)
+        )
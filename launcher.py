@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Multi-process launcher for RaidRequest
+
+Spawns one bot.py process per shard range so event handling is spread across
+CPU cores, restarts processes that crash, and stops them all on SIGINT/SIGTERM
+(each bot drains its in-flight commands first). SIGHUP is forwarded so every
+process reloads changed guild settings.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from sharding import split_shards
+from storage import SHARED_BACKENDS, storage_backend
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass  # dotenv is optional
+
+
+def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards this bot should run"""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "RaidRequest launcher"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as resp:
+        return int(json.load(resp)["shards"])
+
+
+def spawn(index: int, shard_ids, shard_count: int, base_port: int) -> subprocess.Popen:
+    """Start a bot process owning the given shards"""
+    env = dict(os.environ)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+    # Process 0 keeps the platform's PORT; the rest bind the ports after it
+    env["PORT"] = str(base_port + index)
+    print(f"▶️  Process {index}: shards {shard_ids[0]}-{shard_ids[-1]} of {shard_count} (port {env['PORT']})")
+    return subprocess.Popen([sys.executable, "bot.py"], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run RaidRequest across several shard processes")
+    parser.add_argument("--shards", type=int, help="Total shard count (default: Discord's recommendation)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Number of bot processes")
+    parser.add_argument("--stagger", type=float, default=5.0,
+                        help="Seconds between process starts, to respect Discord's identify rate limit")
+    args = parser.parse_args()
+
+    # Every process writes the same store; the log and memory backends are per-process
+    backend = storage_backend()
+    if backend not in SHARED_BACKENDS:
+        print(f"❌ STORAGE_BACKEND={backend} cannot be shared between processes; use firebase or sqlite")
+        return 1
+
+    shard_count = args.shards
+    if shard_count is None:
+        token = os.getenv("BOT_TOKEN")
+        if not token:
+            print("❌ Set BOT_TOKEN or pass --shards")
+            return 1
+        shard_count = recommended_shard_count(token)
+    shard_ranges = split_shards(shard_count, args.processes)
+    base_port = int(os.environ.get("PORT", 10000))
+
+    processes = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for proc in processes.values():
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+
+    def reload(signum, frame):
+        for proc in processes.values():
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGHUP)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload)
+
+    for index, shard_ids in enumerate(shard_ranges):
+        if stopping:
+            break
+        processes[index] = spawn(index, shard_ids, shard_count, base_port)
+        if index < len(shard_ranges) - 1:
+            time.sleep(args.stagger)
+
+    # Restart crashed processes until asked to stop
+    while not stopping:
+        time.sleep(1)
+        for index, proc in list(processes.items()):
+            code = proc.poll()
+            if code is not None and not stopping:
+                print(f"⚠️  Process {index} exited with code {code}, restarting")
+                time.sleep(args.stagger)
+                processes[index] = spawn(index, shard_ranges[index], shard_count, base_port)
+
+    for proc in processes.values():
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
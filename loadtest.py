@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the bot: fake Firebase, fake interactions, real handlers
+
+Starts fake_firebase.FakeFirebase on its own thread and event loop, seeds it with
+simulated guilds and points bot.py's Firebase backend at it. It then replays
+/raidrequest calls and admin edits against the real command handlers at fixed
+arrival rates (open loop, so slow handlers queue up as they would in production).
+It reports throughput, tail latency, event-loop lag, outcomes and store traffic.
+
+Usage:
+    python loadtest.py --guilds 5000 --rate 500 --admin-rate 5 --duration 30
+    python loadtest.py --guilds 20000 --cache-size 1000 --firebase-latency 0.03 --json run.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from fake_discord import FakeChannel, FakeGuild, FakeInteraction
+from fake_firebase import FakeFirebase
+from metrics import INTERACTION_DEFERRALS
+
+MESSAGES = [
+    "Looking for Vault of Glass fresh run tonight, need two more",
+    "**Need** two more for *King's Fall* at reset ||bring relics||",
+    "@everyone join the raid <@&555> now",
+    "Last wish checkpoint, anyone?",
+]
+REJECTION_REASONS = ('not_setup', 'wrong_channel', 'cooldown', 'too_long', 'empty', 'cooldown_race', 'queue_full')
+
+
+def start_fake_firebase(port: int, latency: float, data: Dict) -> FakeFirebase:
+    """Serve a fake Firebase from a separate thread so it does not skew the bot's loop"""
+    fake = FakeFirebase(latency=latency, data=data)
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(fake.start(port=port))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return fake
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/p99.9/max in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        name: round(ordered[min(last, int(len(ordered) * q))] * 1000, 2)
+        for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999), ('max', 1.0))
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that asked to sleep"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+
+class LoadTest:
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.guilds = [FakeGuild(guild_id, [guild_id + 1]) for guild_id in range(1, args.guilds + 1)]
+        self.latencies: Dict[str, List[float]] = {'raidrequest': [], 'admin': []}
+        self.errors = 0
+        self.in_flight = set()
+
+    def pick_guild(self) -> FakeGuild:
+        # skew > 1 concentrates traffic on low guild ids (a few very busy servers)
+        return self.guilds[int(len(self.guilds) * self.rng.random() ** self.args.skew)]
+
+    async def timed(self, kind: str, coro):
+        started = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.errors += 1
+            if self.errors <= 5:
+                print(f"⚠️  {kind} failed: {e!r}")
+        self.latencies[kind].append(time.perf_counter() - started)
+
+    def raid_request(self):
+        guild = self.pick_guild()
+        interaction = FakeInteraction(guild, guild.id * 10, user_id=self.rng.randrange(1, self.args.users + 1))
+        return self.timed('raidrequest', self.bot.raid_request.callback(interaction, self.rng.choice(MESSAGES)))
+
+    def admin_edit(self):
+        guild = self.pick_guild()
+        interaction = FakeInteraction(guild, guild.id * 10)
+        if self.rng.random() < 0.5:
+            edit = self.bot.edit_cooldown.callback(interaction, self.rng.randint(1, 60))
+        else:
+            extra = FakeChannel(guild.id * 10 + 1, guild)
+            edit = self.bot.edit_channel.callback(interaction, self.rng.choice(('add', 'remove')), extra)
+        return self.timed('admin', edit)
+
+    async def generate(self, rate: float, make, deadline: float):
+        """Start make() rate times per second until the deadline, whether or not earlier calls finished"""
+        if rate <= 0:
+            return
+        started = time.perf_counter()
+        issued = 0
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                return
+            due = int((now - started) * rate) - issued
+            for _ in range(due):
+                task = asyncio.ensure_future(make())
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+            issued += due
+            await asyncio.sleep(min(0.001, 1 / rate))
+
+    async def run(self) -> Dict:
+        bot = self.bot
+        monitor = LoopLagMonitor()
+        background = [asyncio.ensure_future(monitor.run()), asyncio.ensure_future(bot.announcer.watch_deadlines())]
+        if self.args.queue_size:
+            background.append(asyncio.ensure_future(bot.run_raid_queue()))
+
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        await asyncio.gather(
+            self.generate(self.args.rate, self.raid_request, deadline),
+            self.generate(self.args.admin_rate, self.admin_edit, deadline),
+        )
+        issued_for = time.perf_counter() - started
+        if self.in_flight:
+            await asyncio.wait(self.in_flight, timeout=30)
+        finished_for = time.perf_counter() - started
+
+        flush_started = time.perf_counter()
+        await bot.settings_writer.close()
+        await bot.history_writer.close()
+        flush_seconds = time.perf_counter() - flush_started
+        for task in background:
+            task.cancel()
+
+        completed = sum(len(samples) for samples in self.latencies.values())
+        return {
+            'config': vars(self.args),
+            'issued_seconds': round(issued_for, 2),
+            'completed': completed,
+            'throughput_per_sec': round(completed / finished_for, 1),
+            'errors': self.errors,
+            'latency_ms': {kind: percentiles(samples) for kind, samples in self.latencies.items()},
+            'loop_lag_ms': percentiles(monitor.samples),
+            'outcomes': {
+                'posted': bot.RAIDS_POSTED.value(),
+                'queued': bot.RAIDS_QUEUED.value(),
+                **{reason: bot.RAID_REJECTIONS.value(reason=reason) for reason in REJECTION_REASONS},
+            },
+            'deferrals': INTERACTION_DEFERRALS.value(),
+            'final_flush_seconds': round(flush_seconds, 3),
+            'firebase_requests': dict(self.fake.requests),
+        }
+
+
+def seed_data(args) -> Dict:
+    """Every guild set up with one allowed channel and one pinged role"""
+    settings = {}
+    for guild_id in range(1, args.guilds + 1):
+        settings[str(guild_id)] = {
+            'setup_complete': True,
+            'cooldown_seconds': args.cooldown,
+            'allowed_channels': [guild_id * 10],
+            'pinged_roles': [guild_id + 1],
+            'cooldown_scope': args.scope,
+            'queue_size': args.queue_size,
+        }
+    return {'guild_settings': settings}
+
+
+def print_report(report: Dict):
+    print(f"\nCompleted {report['completed']} commands ({report['throughput_per_sec']}/s), "
+          f"{report['errors']} errors")
+    for kind, stats in report['latency_ms'].items():
+        if stats:
+            print(f"  {kind:<12} " + "  ".join(f"{name} {value}ms" for name, value in stats.items()))
+    lag = report['loop_lag_ms']
+    print("  loop lag     " + "  ".join(f"{name} {value}ms" for name, value in lag.items()))
+    print("  outcomes     " + ", ".join(f"{name}={int(count)}" for name, count in report['outcomes'].items() if count))
+    print(f"  deferrals    {int(report['deferrals'])}")
+    print("  firebase     " + ", ".join(f"{method}={count}" for method, count in report['firebase_requests'].items()))
+    print(f"  final flush  {report['final_flush_seconds']}s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the bot against local fakes")
+    parser.add_argument("--guilds", type=int, default=5000, help="Simulated guilds")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct users per request stream")
+    parser.add_argument("--rate", type=float, default=200, help="/raidrequest calls per second")
+    parser.add_argument("--admin-rate", type=float, default=2, help="Admin edits per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to generate load for")
+    parser.add_argument("--skew", type=float, default=1.0, help="Traffic skew towards busy guilds (1 = uniform)")
+    parser.add_argument("--cooldown", type=int, default=60, help="Cooldown seconds for every guild")
+    parser.add_argument("--scope", choices=["guild", "channel", "user"], default="guild", help="Cooldown scope")
+    parser.add_argument("--queue-size", type=int, default=0, help="Raid queue size for every guild")
+    parser.add_argument("--cache-size", type=int, default=1000, help="SETTINGS_CACHE_SIZE for the bot")
+    parser.add_argument("--firebase-latency", type=float, default=0.0, help="Seconds added to every fake Firebase call")
+    parser.add_argument("--port", type=int, default=8788, help="Port for the fake Firebase")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    fake = start_fake_firebase(args.port, args.firebase_latency, seed_data(args))
+    os.environ.update({
+        'STORAGE_BACKEND': 'firebase',
+        'FIREBASE_URL': f'http://127.0.0.1:{args.port}',
+        'FIREBASE_SECRET': 'loadtest',
+        'SETTINGS_CACHE_SIZE': str(args.cache_size),
+    })
+    import bot  # noqa: E402  (reads the environment above at import time)
+
+    # Queued raids are posted to channels looked up on the bot
+    channels = {guild.id * 10: FakeChannel(guild.id * 10, guild)
+                for guild in (FakeGuild(guild_id) for guild_id in range(1, args.guilds + 1))}
+    bot.bot.get_channel = channels.get
+
+    test = LoadTest(bot, args)
+    test.fake = fake
+    print(f"🚀 {args.rate:g} raid requests/s and {args.admin_rate:g} admin edits/s "
+          f"across {args.guilds} guilds for {args.duration:g}s")
+    report = asyncio.run(test.run())
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,6 +31,16 @@ def run_bot():
     python_path = get_python_path()
     return subprocess.run([python_path, "bot.py"])
 
+def run_benchmark(extra_args):
+    """Run the raid request benchmark suite"""
+    python_path = get_python_path()
+    return subprocess.run([python_path, "benchmark.py", *extra_args])
+
+def run_bulk(command, extra_args):
+    """Run a bulk settings export, import or migration"""
+    python_path = get_python_path()
+    return subprocess.run([python_path, "bulk.py", command, *extra_args])
+
 def install_deps():
     """Install dependencies"""
     python_path = get_python_path()
@@ -59,10 +69,10 @@ def create_env_file():
 def main():
     parser = argparse.ArgumentParser(description="RaidRequest Bot Management")
     parser.add_argument("command", choices=[
-        "check", "demo", "run", "install", "setup-env"
-    ], help="Command to execute")
+        "check", "demo", "run", "bench", "export", "import", "migrate", "install", "setup-env"
+    ], help="Command to execute (export/import/migrate accept bulk.py options, e.g. --from firebase)")
     
-    args = parser.parse_args()
+    args, extra_args = parser.parse_known_args()
     
     print("🤖 RaidRequest Bot Manager")
     print("=" * 30)
@@ -79,6 +89,14 @@ def main():
         print("Starting Discord bot...")
         return run_bot().returncode
     
+    elif args.command == "bench":
+        print("Running benchmarks...")
+        return run_benchmark(extra_args).returncode
+    
+    elif args.command in ("export", "import", "migrate"):
+        print(f"Running settings {args.command}...")
+        return run_bulk(args.command, extra_args).returncode
+    
     elif args.command == "install":
         print("Installing dependencies...")
         return install_deps().returncode
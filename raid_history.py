@@ -0,0 +1,101 @@
+"""
+Bounded per-guild history of posted raids with rolling aggregates
+
+Each guild keeps its last HISTORY_SIZE raids in a ring buffer, plus counters
+that are updated as raids are recorded: a total, a count per UTC hour of day,
+a count per day for the last DAYS_KEPT days, and the sum of gaps between raids.
+/raidstats reads only the counters and never scans the entries. Messages are
+kept as short hashes, not text.
+"""
+
+import hashlib
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+HISTORY_SIZE = 50
+DAYS_KEPT = 30
+DAY_SECONDS = 86400
+
+# (timestamp, requester id, message hash)
+Entry = Tuple[int, int, str]
+
+
+def message_hash(message: str) -> str:
+    """Short stable fingerprint of a raid message (repeats are visible, the text is not kept)"""
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()[:12]
+
+
+class RaidHistory:
+    """One guild's recent raids and running totals; mutated in place as raids are recorded"""
+    __slots__ = ('entries', 'total', 'hours', 'days', 'gap_total', 'gaps', 'last_at')
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.entries: Deque[Entry] = deque(maxlen=size)
+        self.total = 0
+        self.hours = [0] * 24
+        # UTC day number: raids posted that day
+        self.days: Dict[int, int] = {}
+        self.gap_total = 0
+        self.gaps = 0
+        self.last_at: Optional[int] = None
+
+    def record(self, timestamp: int, user_id: int, message: str):
+        """Add a posted raid and update every aggregate"""
+        self.entries.append((timestamp, user_id, message_hash(message)))
+        self.total += 1
+        self.hours[timestamp // 3600 % 24] += 1
+        day = timestamp // DAY_SECONDS
+        self.days[day] = self.days.get(day, 0) + 1
+        if len(self.days) > DAYS_KEPT:
+            for old_day in [d for d in self.days if d <= day - DAYS_KEPT]:
+                del self.days[old_day]
+        if self.last_at is not None and timestamp >= self.last_at:
+            self.gap_total += timestamp - self.last_at
+            self.gaps += 1
+        if self.last_at is None or timestamp > self.last_at:
+            self.last_at = timestamp
+
+    def count_since(self, now: int, days: int) -> int:
+        """Raids posted over the last `days` UTC days, today included (at most DAYS_KEPT)"""
+        today = now // DAY_SECONDS
+        return sum(count for day, count in self.days.items() if day > today - days)
+
+    def average_gap(self) -> Optional[float]:
+        """Mean seconds between consecutive raids, or None before the second raid"""
+        return self.gap_total / self.gaps if self.gaps else None
+
+    def peak_hours(self, top: int = 3) -> List[Tuple[int, int]]:
+        """The busiest UTC hours of day as (hour, raids), busiest first"""
+        ranked = sorted(range(24), key=lambda hour: self.hours[hour], reverse=True)
+        return [(hour, self.hours[hour]) for hour in ranked[:top] if self.hours[hour]]
+
+    def to_dict(self) -> Dict:
+        data = {
+            'entries': [list(entry) for entry in self.entries],
+            'total': self.total,
+            'hours': list(self.hours),
+            'days': {str(day): count for day, count in self.days.items()},
+            'gap_total': self.gap_total,
+            'gaps': self.gaps,
+        }
+        if self.last_at is not None:
+            data['last_at'] = self.last_at
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict], size: int = HISTORY_SIZE) -> 'RaidHistory':
+        """Rebuild a stored history; None (nothing stored yet) gives an empty one"""
+        history = cls(size)
+        if not data:
+            return history
+        history.entries.extend((int(ts), int(user_id), str(digest)) for ts, user_id, digest in data.get('entries', []))
+        history.total = int(data.get('total', 0))
+        hours = data.get('hours') or []
+        if isinstance(hours, dict):  # Firebase may hand a sparse array back as an object
+            hours = [hours.get(str(hour), 0) for hour in range(24)]
+        history.hours = [int(count or 0) for count in hours][:24] + [0] * (24 - min(len(hours), 24))
+        history.days = {int(day): int(count) for day, count in (data.get('days') or {}).items()}
+        history.gap_total = int(data.get('gap_total', 0))
+        history.gaps = int(data.get('gaps', 0))
+        history.last_at = data.get('last_at')
+        return history
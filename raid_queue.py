@@ -0,0 +1,107 @@
+"""
+Per-cooldown queues of raid requests waiting for the cooldown to end
+
+Each cooldown key holds at most one pending request per user, in arrival order.
+A single scheduler (see bot.run_raid_queue) asks for the keys whose cooldown has
+ended and posts the head of each queue, so there is no sleeping task per guild.
+"""
+
+import heapq
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+MAX_QUEUE_SIZE = 10
+
+
+class QueuedRaid:
+    """An already validated raid request, posted later by the scheduler"""
+    __slots__ = ('channel_id', 'user_id', 'message', 'queued_at')
+
+    def __init__(self, channel_id: int, user_id: int, message: str, queued_at: float):
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.message = message
+        self.queued_at = queued_at
+
+
+class RaidQueue:
+    """Bounded, per-user deduplicated FIFO queues with a due-time heap across all keys"""
+
+    def __init__(self):
+        self._queues: Dict[str, 'OrderedDict[int, QueuedRaid]'] = {}
+        # key: time its head may be posted; heap entries not matching this are stale
+        self._due: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._queues
+
+    def length(self, key: str) -> int:
+        queue = self._queues.get(key)
+        return len(queue) if queue else 0
+
+    def push(self, key: str, raid: QueuedRaid, limit: int) -> Optional[int]:
+        """Queue a request and return its 1-based position, or None if the queue is full
+
+        A user who is already waiting keeps their place and has their message replaced.
+        """
+        queue = self._queues.setdefault(key, OrderedDict())
+        if raid.user_id in queue:
+            queue[raid.user_id] = raid
+            return list(queue).index(raid.user_id) + 1
+        if len(queue) >= limit:
+            if not queue:
+                del self._queues[key]
+            return None
+        queue[raid.user_id] = raid
+        return len(queue)
+
+    def peek(self, key: str) -> Optional[QueuedRaid]:
+        queue = self._queues.get(key)
+        return next(iter(queue.values())) if queue else None
+
+    def pop(self, key: str) -> Optional[QueuedRaid]:
+        """Remove and return the head of a key's queue"""
+        queue = self._queues.get(key)
+        if not queue:
+            return None
+        _, raid = queue.popitem(last=False)
+        if not queue:
+            self.discard(key)
+        return raid
+
+    def discard(self, key: str):
+        """Drop a key's whole queue"""
+        self._queues.pop(key, None)
+        self._due.pop(key, None)
+
+    def schedule(self, key: str, due_time: int):
+        """Post the key's head at due_time (replaces any earlier schedule)"""
+        if key not in self._queues:
+            return
+        if self._due.get(key) == due_time:
+            return
+        self._due[key] = due_time
+        heapq.heappush(self._heap, (due_time, key))
+
+    def next_due(self) -> Optional[int]:
+        """Earliest scheduled time, skipping stale heap entries"""
+        while self._heap:
+            due_time, key = self._heap[0]
+            if self._due.get(key) == due_time:
+                return due_time
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: int) -> List[str]:
+        """Unschedule and return every key whose head is due"""
+        keys = []
+        while self._heap and self._heap[0][0] <= now:
+            due_time, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due_time:
+                del self._due[key]
+                keys.append(key)
+        return keys
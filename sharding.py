@@ -0,0 +1,63 @@
+"""
+Shard configuration shared by the bot and the multi-process launcher
+"""
+
+import os
+from typing import List, Optional
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord's shard routing: (guild_id >> 22) % shard_count"""
+    return (guild_id >> 22) % shard_count
+
+
+def parse_shard_ids(value: str) -> List[int]:
+    """Parse "0,1,2" or "0-3" (or a mix like "0-3,8") into a sorted list of shard ids"""
+    shard_ids = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            shard_ids.update(range(int(start), int(end) + 1))
+        else:
+            shard_ids.add(int(part))
+    return sorted(shard_ids)
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """Divide shard ids into contiguous, evenly sized ranges, one per process"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class ShardConfig:
+    """Shard settings read from SHARD_COUNT ("auto" or a number) and SHARD_IDS"""
+
+    def __init__(self, shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None, enabled: bool = False):
+        self.enabled = enabled
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+
+    @classmethod
+    def from_env(cls) -> 'ShardConfig':
+        count = os.getenv('SHARD_COUNT', '').strip().lower()
+        if not count:
+            return cls()
+        if count == 'auto':
+            return cls(enabled=True)
+        ids = os.getenv('SHARD_IDS', '').strip()
+        return cls(int(count), parse_shard_ids(ids) if ids else None, enabled=True)
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """Whether this process handles a guild's events (always true when not partitioned)"""
+        if not self.shard_count or self.shard_ids is None:
+            return True
+        return shard_for_guild(guild_id, self.shard_count) in self.shard_ids
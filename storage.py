@@ -0,0 +1,885 @@
+"""
+Async storage layer for RaidRequest guild settings and cooldowns
+
+Backends share the Storage interface and are selected with the STORAGE_BACKEND
+environment variable: "firebase", "sqlite", "log" (append-only JSONL, the local
+default) or "memory" (tests and benchmarks).
+
+Every backend stores JSON values under (table, key) pairs; Firebase maps them to
+/<table>/<key>. Guild settings live in the "guild_settings" table and cooldown
+end times in "cooldowns", keyed by guild id (plus a channel or user suffix for
+narrower cooldown scopes); "meta" holds bot-wide values
+such as the hash of the last synced command tree, and "raid_history" each guild's
+recent raids and raid counts. Firebase can also stream a
+table's changes (Storage.watch), which keeps several bot processes' caches in step.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: the append log is not locked against a second process
+
+SETTINGS_TABLE = 'guild_settings'
+COOLDOWNS_TABLE = 'cooldowns'
+META_TABLE = 'meta'
+HISTORY_TABLE = 'raid_history'
+
+# Backends that several bot processes can share (launcher.py requires one of these)
+SHARED_BACKENDS = ('firebase', 'sqlite')
+
+# A table's changes, and whether they are the whole table (keys left out were deleted)
+TableChanges = Tuple[Dict[str, Any], bool]
+
+
+def _copy(value):
+    """Detach a value the way a JSON round trip through a real store would"""
+    return json.loads(json.dumps(value))
+
+
+def _serialize(changes: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Encode values to JSON text on the event loop before handing them to a thread"""
+    return {k: None if v is None else json.dumps(v) for k, v in changes.items()}
+
+
+class Storage:
+    """Interface every storage backend implements"""
+
+    async def load_table(self, table: str) -> Dict[str, Any]:
+        """Fetch every key in a table"""
+        raise NotImplementedError
+
+    async def load_key(self, table: str, key: str) -> Any:
+        """Fetch one key, or None if it is not stored"""
+        raise NotImplementedError
+
+    async def save_keys(self, table: str, changes: Dict[str, Any]):
+        """Write several keys at once (None deletes a key)"""
+        raise NotImplementedError
+
+    async def list_keys(self, table: str) -> List[str]:
+        """Every key in a table, without fetching the values"""
+        return list(await self.load_table(table))
+
+    async def load_keys(self, table: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Fetch several keys at once; keys that are not stored are left out"""
+        keys = list(keys)
+        values = await asyncio.gather(*(self.load_key(table, key) for key in keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def load_key_range(self, table: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Fetch a run of keys that are adjacent in sorted key order (a slice of sorted(list_keys))
+
+        Backends with range queries read the run in one request; for scattered keys use load_keys.
+        """
+        return await self.load_keys(table, keys)
+
+    async def replace_table(self, table: str, data: Dict[str, Any]):
+        """Replace a whole table (migrations only)"""
+        raise NotImplementedError
+
+    async def compare_and_set(self, table: str, key: str, predicate: Callable[[Any], bool], value: Any) -> Tuple[bool, Any]:
+        """Write value (None deletes) only if predicate(current value) holds; returns (written, value now stored)
+
+        This default is only atomic within one process (no other writer can run between
+        the read and the write on the event loop); shared backends override it.
+        """
+        current = await self.load_key(table, key)
+        if not predicate(current):
+            return False, current
+        await self.save_keys(table, {key: value})
+        return True, value
+
+    def watch(self, table: str) -> AsyncIterator[TableChanges]:
+        """Stream changes to a table as (changes, complete) pairs, None values meaning deleted
+
+        The first pair is the whole table. Backends that cannot push changes raise
+        NotImplementedError.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Release any connections or file handles"""
+
+    # Guild settings
+
+    async def load_settings(self) -> Dict[int, Dict]:
+        """Fetch every guild's settings"""
+        return {int(k): v for k, v in (await self.load_table(SETTINGS_TABLE)).items()}
+
+    async def load_guild(self, guild_id: int) -> Optional[Dict]:
+        """Fetch one guild's settings, or None if it has never been set up"""
+        return await self.load_key(SETTINGS_TABLE, str(guild_id))
+
+    async def list_guilds(self) -> List[int]:
+        """Every guild with stored settings"""
+        return [int(k) for k in await self.list_keys(SETTINGS_TABLE) if k.isdigit()]
+
+    async def load_guilds(self, guild_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Fetch several guilds' settings at once; guilds never set up are left out"""
+        rows = await self.load_keys(SETTINGS_TABLE, [str(guild_id) for guild_id in guild_ids])
+        return {int(k): v for k, v in rows.items()}
+
+    async def load_guild_range(self, guild_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Fetch a run of guilds adjacent in key order (see load_key_range)"""
+        rows = await self.load_key_range(SETTINGS_TABLE, [str(guild_id) for guild_id in guild_ids])
+        return {int(k): v for k, v in rows.items()}
+
+    async def save_guilds(self, changes: Dict[int, Optional[Dict]]):
+        """Write several guilds' settings at once (None deletes a guild)"""
+        await self.save_keys(SETTINGS_TABLE, {str(k): v for k, v in changes.items()})
+
+    async def replace_guild_if_unchanged(self, guild_id: int, expected: Dict, settings: Optional[Dict]) -> bool:
+        """Write (or delete, for None) a guild's settings only if the store still holds expected"""
+        written, _ = await self.compare_and_set(
+            SETTINGS_TABLE, str(guild_id), lambda current: current == expected, settings
+        )
+        return written
+
+    async def save_guild(self, guild_id: int, settings: Optional[Dict]):
+        """Write a single guild's settings, or delete them when settings is None"""
+        await self.save_guilds({guild_id: settings})
+
+    async def save_settings(self, settings: Dict[int, Dict]):
+        """Replace every stored guild (migrations only)"""
+        await self.replace_table(SETTINGS_TABLE, {str(k): v for k, v in settings.items()})
+
+    async def watch_guilds(self) -> AsyncIterator[Tuple[Dict[int, Optional[Dict]], bool]]:
+        """Stream guild settings changes made by any writer (see watch)"""
+        async for changes, complete in self.watch(SETTINGS_TABLE):
+            yield {int(k): v for k, v in changes.items() if k.isdigit()}, complete
+
+    # Raid history
+
+    async def load_history(self, guild_id: int) -> Optional[Dict]:
+        """Fetch one guild's raid history, or None if it has no raids yet"""
+        return await self.load_key(HISTORY_TABLE, str(guild_id))
+
+    async def list_histories(self) -> List[int]:
+        """Every guild with a stored raid history"""
+        return [int(k) for k in await self.list_keys(HISTORY_TABLE) if k.isdigit()]
+
+    async def save_histories(self, changes: Dict[int, Optional[Dict]]):
+        """Write several guilds' raid histories at once (None deletes a history)"""
+        await self.save_keys(HISTORY_TABLE, {str(k): v for k, v in changes.items()})
+
+    # Bot-wide values
+
+    async def load_meta(self, key: str) -> Any:
+        """Fetch a bot-wide value"""
+        return await self.load_key(META_TABLE, key)
+
+    async def save_meta(self, key: str, value: Any):
+        """Store a bot-wide value"""
+        await self.save_keys(META_TABLE, {key: value})
+
+    # Cooldowns (keyed by cooldown key: a guild id, optionally with a channel/user suffix)
+
+    async def load_cooldowns(self) -> Dict[str, int]:
+        """Fetch every stored cooldown end time"""
+        return await self.load_table(COOLDOWNS_TABLE)
+
+    async def save_cooldowns(self, changes: Dict[str, Optional[int]]):
+        """Write cooldown end times (None clears a cooldown)"""
+        await self.save_keys(COOLDOWNS_TABLE, changes)
+
+    async def claim_cooldown(self, key: str, now: int, end_time: int) -> Tuple[bool, Optional[int]]:
+        """Start a cooldown unless one is still running; returns (claimed, stored end time)"""
+        return await self.compare_and_set(
+            COOLDOWNS_TABLE, key, lambda current: current is None or current <= now, end_time
+        )
+
+    async def delete_expired_cooldown(self, key: str, now: int) -> bool:
+        """Delete a stored cooldown only if it is still expired (a new claim may have replaced it)"""
+        deleted, _ = await self.compare_and_set(
+            COOLDOWNS_TABLE, key, lambda current: current is not None and current <= now, None
+        )
+        return deleted
+
+
+class MemoryStorage(Storage):
+    """Process-local storage for tests and benchmarks"""
+
+    def __init__(self, tables: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.tables: Dict[str, Dict[str, Any]] = {t: dict(rows) for t, rows in (tables or {}).items()}
+
+    async def load_table(self, table: str) -> Dict[str, Any]:
+        return _copy(self.tables.get(table, {}))
+
+    async def load_key(self, table: str, key: str) -> Any:
+        value = self.tables.get(table, {}).get(key)
+        return None if value is None else _copy(value)
+
+    async def save_keys(self, table: str, changes: Dict[str, Any]):
+        rows = self.tables.setdefault(table, {})
+        for key, value in changes.items():
+            if value is None:
+                rows.pop(key, None)
+            else:
+                rows[key] = _copy(value)
+
+    async def replace_table(self, table: str, data: Dict[str, Any]):
+        self.tables[table] = _copy(data)
+
+    async def list_keys(self, table: str) -> List[str]:
+        return list(self.tables.get(table, {}))
+
+
+async def _server_sent_events(content: aiohttp.StreamReader) -> AsyncIterator[Tuple[str, str]]:
+    """Parse a text/event-stream body into (event, data) pairs
+
+    Reads raw chunks rather than lines: the first Firebase event carries a whole
+    table on one line, far beyond aiohttp's line length limit.
+    """
+    partial: List[bytes] = []
+    event, data = 'message', []
+    async for chunk in content.iter_any():
+        lines = chunk.split(b'\n')
+        partial.append(lines[0])
+        if len(lines) == 1:
+            continue
+        complete = [b''.join(partial)] + lines[1:-1]
+        partial = [lines[-1]]
+        for raw in complete:
+            line = raw.decode('utf-8').rstrip('\r')
+            if not line:
+                if data:
+                    yield event, '\n'.join(data)
+                event, data = 'message', []
+            elif line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data.append(line[5:].lstrip(' '))
+
+
+class FirebaseStorage(Storage):
+    """Firebase Realtime Database (legacy REST API) over a pooled aiohttp session"""
+
+    # Firebase sends a keep-alive every 30 seconds; reconnect if a stream goes quiet for longer
+    STREAM_IDLE_TIMEOUT = 90
+    # Event payloads larger than this are decoded off the event loop
+    STREAM_DECODE_IN_THREAD = 1 << 20
+
+    def __init__(self, url: str, secret: str, timeout: float = 10, pool_size: int = 10):
+        self.url = url.rstrip('/')
+        self.secret = secret
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _endpoint(self, path: str) -> str:
+        """Build the REST URL for a database path"""
+        return f"{self.url}/{path}.json"
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def load_table(self, table: str) -> Dict[str, Any]:
+        return await self.load_key(table, '') or {}
+
+    async def load_key(self, table: str, key: str) -> Any:
+        session = await self._get_session()
+        path = f'{table}/{key}' if key else table
+        async with session.get(self._endpoint(path), params={'auth': self.secret}) as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    async def list_keys(self, table: str) -> List[str]:
+        # shallow=true returns {key: true} instead of every guild's full settings
+        session = await self._get_session()
+        async with session.get(self._endpoint(table), params={'auth': self.secret, 'shallow': 'true'}) as resp:
+            resp.raise_for_status()
+            return list(await resp.json() or {})
+
+    async def load_key_range(self, table: str, keys: Iterable[str]) -> Dict[str, Any]:
+        # One range query over the run's first..last key instead of a GET per key. load_keys
+        # keeps the per-key GETs, since a range over scattered keys downloads everything between them
+        keys = sorted(keys)
+        if not keys:
+            return {}
+        session = await self._get_session()
+        params = {
+            'auth': self.secret, 'orderBy': '"$key"',
+            'startAt': json.dumps(keys[0]), 'endAt': json.dumps(keys[-1]),
+        }
+        async with session.get(self._endpoint(table), params=params) as resp:
+            resp.raise_for_status()
+            rows = await resp.json() or {}
+        wanted = set(keys)
+        found = {key: value for key, value in rows.items() if key in wanted}
+        # Firebase sorts 32-bit integer keys numerically; fetch anything the range missed directly
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(await self.load_keys(table, missing))
+        return found
+
+    async def save_keys(self, table: str, changes: Dict[str, Any]):
+        # One multi-path PATCH; null values delete their node
+        session = await self._get_session()
+        async with session.patch(self._endpoint(table), params={'auth': self.secret}, json=changes) as resp:
+            resp.raise_for_status()
+
+    async def replace_table(self, table: str, data: Dict[str, Any]):
+        session = await self._get_session()
+        async with session.put(self._endpoint(table), params={'auth': self.secret}, json=data) as resp:
+            resp.raise_for_status()
+
+    async def compare_and_set(self, table: str, key: str, predicate: Callable[[Any], bool], value: Any,
+                              attempts: int = 5) -> Tuple[bool, Any]:
+        # Conditional REST write: the PUT (or DELETE, for None) only applies if the node still has
+        # the ETag we read. A PUT of None would send no body, which Firebase rejects.
+        session = await self._get_session()
+        url = self._endpoint(f'{table}/{key}')
+        params = {'auth': self.secret}
+        async with session.get(url, params=params, headers={'X-Firebase-ETag': 'true'}) as resp:
+            resp.raise_for_status()
+            current = await resp.json()
+            etag = resp.headers['ETag']
+        for _ in range(attempts):
+            if not predicate(current):
+                return False, current
+            if value is None:
+                request = session.delete(url, params=params, headers={'if-match': etag})
+            else:
+                request = session.put(url, params=params, json=value, headers={'if-match': etag})
+            async with request as resp:
+                if resp.status == 412:
+                    # Someone else wrote first; the 412 carries their value and the new ETag
+                    current = await resp.json()
+                    etag = resp.headers['ETag']
+                    continue
+                resp.raise_for_status()
+                return True, value
+        raise RuntimeError(f"Conditional write to {table}/{key} conflicted {attempts} times")
+
+    async def watch(self, table: str) -> AsyncIterator[TableChanges]:
+        # REST streaming: one long-lived GET answered with put/patch server-sent events.
+        # Ends (or raises) when the connection drops; the caller reconnects.
+        session = await self._get_session()
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.STREAM_IDLE_TIMEOUT)
+        async with session.get(self._endpoint(table), params={'auth': self.secret},
+                               headers={'Accept': 'text/event-stream'}, timeout=timeout) as resp:
+            resp.raise_for_status()
+            async for event, data in _server_sent_events(resp.content):
+                if event in ('cancel', 'auth_revoked'):
+                    raise ConnectionError(f"Firebase closed the {table} stream ({event})")
+                if event not in ('put', 'patch'):
+                    continue  # keep-alive
+                if len(data) > self.STREAM_DECODE_IN_THREAD:
+                    message = await asyncio.to_thread(json.loads, data)
+                else:
+                    message = json.loads(data)
+                yield await self._stream_changes(table, event, message['path'], message['data'])
+
+    async def _stream_changes(self, table: str, event: str, path: str, data: Any) -> TableChanges:
+        """Turn a put/patch event into whole-key changes, re-reading keys that changed in part"""
+        parts = [part for part in path.split('/') if part]
+        if event == 'put':
+            writes = [(parts, data)]
+        else:
+            writes = [(parts + [part for part in sub_path.split('/') if part], value)
+                      for sub_path, value in (data or {}).items()]
+        changes: Dict[str, Any] = {}
+        partial = set()
+        for write_parts, value in writes:
+            if not write_parts:
+                return (value or {}), True
+            if len(write_parts) == 1:
+                changes[write_parts[0]] = value
+            else:
+                partial.add(write_parts[0])
+        if partial:
+            # Per-key GETs: the changed keys can be anywhere in the table
+            stored = await self.load_keys(table, partial)
+            changes.update({key: stored.get(key) for key in partial})
+        return changes, False
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class SQLiteStorage(Storage):
+    """Local SQLite database in WAL mode; queries run in a worker thread"""
+
+    def __init__(self, path: str = 'guild_settings.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        # timeout: wait for other processes' write locks instead of failing immediately
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS kv ('
+            'tbl TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (tbl, key)'
+            ') WITHOUT ROWID'
+        )
+
+    def _load(self, table: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute('SELECT key, value FROM kv WHERE tbl = ?', (table,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _load_one(self, table: str, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM kv WHERE tbl = ? AND key = ?', (table, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _load_keys(self, table: str, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM kv WHERE tbl = ? AND key IN ({','.join('?' * len(chunk))})",
+                    (table, *chunk)
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def _list_keys(self, table: str) -> List[str]:
+        with self._lock:
+            return [key for (key,) in self._conn.execute('SELECT key FROM kv WHERE tbl = ?', (table,))]
+
+    def _write(self, table: str, changes: Dict[str, Optional[str]], replace: bool = False):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                if replace:
+                    self._conn.execute('DELETE FROM kv WHERE tbl = ?', (table,))
+                for key, value in changes.items():
+                    if value is None:
+                        self._conn.execute('DELETE FROM kv WHERE tbl = ? AND key = ?', (table, key))
+                    else:
+                        self._conn.execute(
+                            'INSERT OR REPLACE INTO kv (tbl, key, value) VALUES (?, ?, ?)', (table, key, value)
+                        )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _compare_and_set(self, table: str, key: str, predicate: Callable[[Any], bool], value: Any) -> Tuple[bool, Any]:
+        with self._lock:
+            # IMMEDIATE takes the database write lock up front, so the read and write are one step
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT value FROM kv WHERE tbl = ? AND key = ?', (table, key)).fetchone()
+                current = json.loads(row[0]) if row else None
+                if not predicate(current):
+                    self._conn.execute('ROLLBACK')
+                    return False, current
+                if value is None:
+                    self._conn.execute('DELETE FROM kv WHERE tbl = ? AND key = ?', (table, key))
+                else:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO kv (tbl, key, value) VALUES (?, ?, ?)', (table, key, json.dumps(value))
+                    )
+                self._conn.execute('COMMIT')
+                return True, value
+            except Exception:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                raise
+
+    async def load_table(self, table: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._load, table)
+
+    async def load_key(self, table: str, key: str) -> Any:
+        return await asyncio.to_thread(self._load_one, table, key)
+
+    async def list_keys(self, table: str) -> List[str]:
+        return await asyncio.to_thread(self._list_keys, table)
+
+    async def load_keys(self, table: str, keys: Iterable[str]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._load_keys, table, list(keys))
+
+    async def save_keys(self, table: str, changes: Dict[str, Any]):
+        await asyncio.to_thread(self._write, table, _serialize(changes))
+
+    async def replace_table(self, table: str, data: Dict[str, Any]):
+        await asyncio.to_thread(self._write, table, _serialize(data), True)
+
+    async def compare_and_set(self, table: str, key: str, predicate: Callable[[Any], bool], value: Any) -> Tuple[bool, Any]:
+        return await asyncio.to_thread(self._compare_and_set, table, key, predicate, _copy(value))
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AppendLogStorage(Storage):
+    """Append-only JSONL log of writes, compacted once it outgrows the live data
+
+    Single-process only: compaction rewrites the file from this process's view, so the
+    log is locked (path + '.lock') for as long as it is open.
+    """
+
+    def __init__(self, path: str = 'guild_settings.log', compact_ratio: float = 2.0, compact_min: int = 1000):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        # _lock serializes writers across fsync and compaction; _data_lock only guards the
+        # in-memory view, so reads on the event loop never wait on the disk
+        self._lock = threading.RLock()
+        self._data_lock = threading.Lock()
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self._records = 0
+        self._lock_file = self._acquire_file_lock()
+        self._replay()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _acquire_file_lock(self):
+        """Hold an exclusive lock so a second process cannot open (and later clobber) the log"""
+        lock_file = open(self.path + '.lock', 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise RuntimeError(
+                    f"{self.path} is already open in another process; use STORAGE_BACKEND=sqlite "
+                    "or firebase to share storage between processes"
+                )
+        return lock_file
+
+    def _live_records(self) -> int:
+        with self._data_lock:
+            return sum(len(rows) for rows in self.tables.values())
+
+    def _replay(self):
+        """Rebuild the live view from the log, cutting off a torn final line"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                tail = data[end:]
+                try:
+                    json.loads(tail)
+                    # A complete record that only lost its newline: keep it
+                    f.write(b'\n')
+                    data += b'\n'
+                    end = len(data)
+                except ValueError:
+                    # A crash mid-append left a partial record; drop it so the next append starts on a fresh line
+                    print(f"Dropping a torn record at the end of {self.path}")
+                    f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+        for line in data[:end].decode('utf-8').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(record['table'], record['key'], record['value'])
+            self._records += 1
+
+    def _apply(self, table: str, key: str, value: Any):
+        if value is None:
+            self.tables.get(table, {}).pop(key, None)
+        else:
+            self.tables.setdefault(table, {})[key] = value
+
+    def _append(self, table: str, changes: Dict[str, Any]):
+        with self._lock:
+            lines = [json.dumps({'table': table, 'key': key, 'value': value}) + '\n' for key, value in changes.items()]
+            with self._data_lock:
+                for key, value in changes.items():
+                    self._apply(table, key, value)
+            self._file.write(''.join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._records += len(lines)
+            if self._records > max(self.compact_min, self.compact_ratio * self._live_records()):
+                self._compact()
+
+    def _compare_and_set(self, table: str, key: str, predicate: Callable[[Any], bool], value: Any) -> Tuple[bool, Any]:
+        with self._lock:
+            # Only writers change the view and they all hold _lock, so this read cannot go stale
+            current = self.tables.get(table, {}).get(key)
+            if not predicate(current):
+                return False, current
+            self._append(table, {key: value})
+            return True, value
+
+    def _compact(self):
+        """Rewrite the log with one record per live key and swap it in atomically"""
+        # Values are never edited in place, so a shallow snapshot is enough to write from
+        with self._data_lock:
+            snapshot = {table: list(rows.items()) for table, rows in self.tables.items()}
+        tmp_path = self.path + '.tmp'
+        records = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for table, rows in snapshot.items():
+                for key, value in rows:
+                    f.write(json.dumps({'table': table, 'key': key, 'value': value}) + '\n')
+                records += len(rows)
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._records = records
+
+    async def load_table(self, table: str) -> Dict[str, Any]:
+        with self._data_lock:
+            return _copy(self.tables.get(table, {}))
+
+    async def load_key(self, table: str, key: str) -> Any:
+        with self._data_lock:
+            value = self.tables.get(table, {}).get(key)
+            return None if value is None else _copy(value)
+
+    async def list_keys(self, table: str) -> List[str]:
+        with self._data_lock:
+            return list(self.tables.get(table, {}))
+
+    async def load_keys(self, table: str, keys: Iterable[str]) -> Dict[str, Any]:
+        with self._data_lock:
+            rows = self.tables.get(table, {})
+            return {key: _copy(rows[key]) for key in keys if key in rows}
+
+    async def save_keys(self, table: str, changes: Dict[str, Any]):
+        # Snapshot on the event loop so the worker thread never sees a half-edited dict
+        await asyncio.to_thread(self._append, table, {k: None if v is None else _copy(v) for k, v in changes.items()})
+
+    async def replace_table(self, table: str, data: Dict[str, Any]):
+        snapshot = _copy(data)
+
+        def replace():
+            with self._lock:
+                with self._data_lock:
+                    self.tables[table] = snapshot
+                self._compact()
+        await asyncio.to_thread(replace)
+
+    async def compare_and_set(self, table: str, key: str, predicate: Callable[[Any], bool], value: Any) -> Tuple[bool, Any]:
+        # Atomic because the file lock keeps every other process out of the log
+        return await asyncio.to_thread(self._compare_and_set, table, key, predicate, _copy(value))
+
+    async def close(self):
+        def close():
+            with self._lock:
+                self._file.close()
+                self._lock_file.close()  # releases the flock
+        await asyncio.to_thread(close)
+
+
+def storage_backend(backend: Optional[str] = None) -> str:
+    """Name of the backend create_storage builds: STORAGE_BACKEND, else firebase when FIREBASE_URL is set, else log"""
+    return (backend or os.getenv('STORAGE_BACKEND') or ('firebase' if os.getenv('FIREBASE_URL') else 'log')).lower()
+
+
+def create_storage(backend: Optional[str] = None, path: Optional[str] = None) -> Storage:
+    """Build the backend named by STORAGE_BACKEND (firebase when FIREBASE_URL is set, else log)
+
+    path overrides STORAGE_PATH for the file-based backends.
+    """
+    backend = storage_backend(backend)
+    if backend == 'firebase':
+        url = os.getenv('FIREBASE_URL')
+        secret = os.getenv('FIREBASE_SECRET')
+        if not url:
+            raise ValueError("FIREBASE_URL environment variable is not set. Please set it in your .env file.")
+        if not secret:
+            raise ValueError("FIREBASE_SECRET environment variable is not set. Please set it in your .env file.")
+        return FirebaseStorage(url, secret)
+    if backend == 'sqlite':
+        return SQLiteStorage(path or os.getenv('STORAGE_PATH', 'guild_settings.db'))
+    if backend == 'log':
+        return AppendLogStorage(path or os.getenv('STORAGE_PATH', 'guild_settings.log'))
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (expected firebase, sqlite, log or memory)")
+
+
+class WriteBehindBuffer:
+    """Coalesces per-guild edits into batched, retried background writes"""
+
+    def __init__(self, save: Callable[[Dict[int, Any]], Awaitable[None]],
+                 delay: float = 2.0, backoff: float = 1.0, max_backoff: float = 60.0):
+        self.save = save
+        self.delay = delay
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._dirty: Dict[int, Any] = {}
+        self._inflight: Dict[int, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Clear while a save is in flight, so close() can wait for it instead of aborting it
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def pending(self) -> int:
+        """Number of guilds waiting to be written"""
+        return len(self._dirty)
+
+    def is_pending(self, guild_id: int) -> bool:
+        """Whether a guild has a write that the store has not acknowledged yet"""
+        return guild_id in self._dirty or guild_id in self._inflight
+
+    def pending_value(self, guild_id: int) -> Any:
+        """The newest unacknowledged value for a guild"""
+        if guild_id in self._dirty:
+            return self._dirty[guild_id]
+        return self._inflight.get(guild_id)
+
+    def mark_dirty(self, guild_id: int, value: Any):
+        """Queue a guild's value (None deletes it) for the next batched write"""
+        self._dirty[guild_id] = value
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """Wait out the coalescing window, then flush until nothing is dirty"""
+        attempt = 0
+        await asyncio.sleep(self.delay)
+        while self._dirty:
+            if await self.flush():
+                attempt = 0
+                if self._dirty:
+                    await asyncio.sleep(self.delay)
+            else:
+                attempt += 1
+                await asyncio.sleep(min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+
+    async def flush(self) -> bool:
+        """Write every dirty guild in one request; failed guilds stay dirty"""
+        if not self._dirty:
+            return True
+        changes, self._dirty = self._dirty, {}
+        self._inflight.update(changes)
+        self._idle.clear()
+        try:
+            await self.save(changes)
+            return True
+        except Exception as e:
+            print(f"Error writing {len(changes)} guild(s): {e}")
+            # Keep any newer edit made while this write was in flight
+            for guild_id, value in changes.items():
+                self._dirty.setdefault(guild_id, value)
+            return False
+        except BaseException:
+            # Cancelled mid-write (close() during a flush): keep the batch for the final flush
+            for guild_id, value in changes.items():
+                self._dirty.setdefault(guild_id, value)
+            raise
+        finally:
+            self._idle.set()
+            for guild_id, value in changes.items():
+                if self._inflight.get(guild_id) is value:
+                    del self._inflight[guild_id]
+
+    async def close(self, attempts: int = 3):
+        """Stop the background task and flush whatever is still pending"""
+        if self._task is not None and not self._task.done():
+            # Let a write that is already in flight finish, then cancel the task's sleep
+            await self._idle.wait()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for attempt in range(attempts):
+            if await self.flush():
+                return
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+        print(f"Giving up on {len(self._dirty)} unsaved guild(s) at shutdown: {sorted(self._dirty)}")
+
+
+class GuildSettingsCache:
+    """Bounded LRU cache of per-guild settings, loaded on first use and refreshed after a TTL"""
+
+    def __init__(self, loader: Callable[[int], Awaitable[Optional[Dict]]], max_size: int = 1000, ttl: float = 300):
+        self.loader = loader
+        self.max_size = max_size
+        self.ttl = ttl
+        # guild_id: (loaded_at, settings); None settings cache "not set up" too
+        self._entries: "OrderedDict[int, Tuple[float, Optional[Dict]]]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Guilds set or invalidated while a load was in flight; that load's result is older
+        self._superseded: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._entries
+
+    def guild_ids(self) -> List[int]:
+        """Guilds currently cached, least recently used first"""
+        return list(self._entries)
+
+    def peek(self, guild_id: int) -> Optional[Dict]:
+        """Return cached settings without loading or touching LRU order"""
+        entry = self._entries.get(guild_id)
+        return entry[1] if entry else None
+
+    def set(self, guild_id: int, settings: Optional[Dict]):
+        """Store settings for a guild, evicting the least recently used guild if full"""
+        if guild_id in self._loading:
+            self._superseded.add(guild_id)
+        self._entries[guild_id] = (time.monotonic(), settings)
+        self._entries.move_to_end(guild_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, guild_id: int):
+        """Drop a guild so the next lookup reloads it"""
+        if guild_id in self._loading:
+            self._superseded.add(guild_id)
+        self._entries.pop(guild_id, None)
+
+    async def get(self, guild_id: int) -> Optional[Dict]:
+        """Return a guild's settings, loading them once if missing or stale"""
+        entry = self._entries.get(guild_id)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(guild_id)
+            return entry[1]
+
+        # Share one load between concurrent lookups of the same guild
+        future = self._loading.get(guild_id)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[guild_id] = future
+        try:
+            settings = await self.loader(guild_id)
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # This task was cancelled; the lookups sharing its load were not, so fail them normally
+                e = RuntimeError(f"Loading settings for guild {guild_id} was cancelled")
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            if guild_id in self._superseded:
+                # Never let this read replace a newer write; hand out that write if it is cached
+                entry = self._entries.get(guild_id)
+                if entry is not None:
+                    settings = entry[1]
+            else:
+                self.set(guild_id, settings)
+            future.set_result(settings)
+            return settings
+        finally:
+            del self._loading[guild_id]
+            self._superseded.discard(guild_id)
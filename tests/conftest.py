@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the flat top-level modules (storage, bot, ...) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# bot.py builds its storage at import time; keep it in memory
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from storage import AppendLogStorage
+
+
+def test_reopen_replays_the_log(tmp_path):
+    path = str(tmp_path / 'settings.log')
+
+    async def write():
+        store = AppendLogStorage(path)
+        await store.save_guilds({1: {'cooldown_seconds': 30}, 2: {'cooldown_seconds': 60}})
+        await store.save_guild(2, None)
+        await store.close()
+
+    async def read():
+        store = AppendLogStorage(path)
+        try:
+            return await store.load_settings()
+        finally:
+            await store.close()
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == {1: {'cooldown_seconds': 30}}
+
+
+def test_torn_tail_is_cut_off_before_the_next_append(tmp_path):
+    path = tmp_path / 'settings.log'
+    record = json.dumps({'table': 'guild_settings', 'key': '1', 'value': {'cooldown_seconds': 30}})
+    path.write_text(record + '\n' + record[:20])
+
+    async def append():
+        store = AppendLogStorage(str(path))
+        await store.save_guild(2, {'cooldown_seconds': 60})
+        await store.close()
+
+    async def read():
+        store = AppendLogStorage(str(path))
+        try:
+            return await store.load_settings()
+        finally:
+            await store.close()
+
+    asyncio.run(append())
+    assert asyncio.run(read()) == {1: {'cooldown_seconds': 30}, 2: {'cooldown_seconds': 60}}
+    assert all(json.loads(line) for line in path.read_text().splitlines())
+
+
+def test_final_record_without_newline_is_kept(tmp_path):
+    path = tmp_path / 'settings.log'
+    path.write_text(json.dumps({'table': 'guild_settings', 'key': '1', 'value': {'cooldown_seconds': 30}}))
+
+    async def main():
+        store = AppendLogStorage(str(path))
+        await store.save_guild(2, {'cooldown_seconds': 60})
+        await store.close()
+        store = AppendLogStorage(str(path))
+        try:
+            return await store.load_settings()
+        finally:
+            await store.close()
+
+    assert asyncio.run(main()) == {1: {'cooldown_seconds': 30}, 2: {'cooldown_seconds': 60}}
+
+
+def test_compaction_keeps_live_keys_only(tmp_path):
+    path = tmp_path / 'settings.log'
+
+    async def main():
+        store = AppendLogStorage(str(path), compact_min=10)
+        for n in range(50):
+            await store.save_guild(n % 3, {'cooldown_seconds': n})
+        await store.close()
+        store = AppendLogStorage(str(path))
+        try:
+            return await store.load_settings()
+        finally:
+            await store.close()
+
+    assert asyncio.run(main()) == {0: {'cooldown_seconds': 48}, 1: {'cooldown_seconds': 49}, 2: {'cooldown_seconds': 47}}
+    assert len(path.read_text().splitlines()) <= 10
+
+
+def test_reads_do_not_wait_for_a_writer(tmp_path):
+    async def main():
+        store = AppendLogStorage(str(tmp_path / 'settings.log'))
+        await store.save_guild(1, {'cooldown_seconds': 30})
+        held = threading.Event()
+        release = threading.Event()
+
+        def slow_writer():
+            # Stands in for a writer stuck in fsync or compaction
+            with store._lock:
+                held.set()
+                release.wait(5)
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        held.wait()
+        try:
+            started = time.perf_counter()
+            assert await store.load_guild(1) == {'cooldown_seconds': 30}
+            assert await store.list_guilds() == [1]
+            # A read that blocked on the writer would have waited out release.wait(5)
+            assert time.perf_counter() - started < 1
+        finally:
+            release.set()
+            writer.join()
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_second_open_of_the_same_log_is_refused(tmp_path):
+    path = str(tmp_path / 'settings.log')
+
+    async def main():
+        store = AppendLogStorage(path)
+        try:
+            with pytest.raises(RuntimeError):
+                AppendLogStorage(path)
+        finally:
+            await store.close()
+        # The lock goes with the first store
+        reopened = AppendLogStorage(path)
+        await reopened.close()
+
+    asyncio.run(main())
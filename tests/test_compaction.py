@@ -0,0 +1,107 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from sharding import ShardConfig
+from storage import MemoryStorage
+
+# Mixed-length snowflakes, whose numeric and string orders differ, on alternating shards of 2
+GUILD_IDS = [99000000000000000 + (n << 22) for n in range(3)] + [100000000000000000 + (n << 22) for n in range(3)]
+DEPARTED = (GUILD_IDS[0], GUILD_IDS[3])
+
+
+class RecordingStorage(MemoryStorage):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = []
+        self.during_read = None
+
+    async def load_key_range(self, table, keys):
+        keys = list(keys)
+        self.reads.append(('range', keys))
+        rows = await super().load_keys(table, keys)
+        if self.during_read:
+            await self.during_read(keys)
+        return rows
+
+    async def load_keys(self, table, keys):
+        keys = list(keys)
+        self.reads.append(('keys', keys))
+        return await super().load_keys(table, keys)
+
+
+def settings(channels):
+    return {'setup_complete': True, 'allowed_channels': channels, 'pinged_roles': [7]}
+
+
+@pytest.fixture
+def compaction(monkeypatch):
+    store = RecordingStorage({'guild_settings': {str(guild_id): settings([1]) for guild_id in GUILD_IDS}})
+    channels = {1, 3}  # channel 2 was deleted
+    present = SimpleNamespace(
+        unavailable=False,
+        get_channel=lambda channel_id: object() if channel_id in channels else None,
+        get_role=lambda role_id: object(),
+    )
+    monkeypatch.setattr(bot, 'storage', store)
+    monkeypatch.setattr(bot, 'COMPACT_CHUNK_SIZE', 3)
+    monkeypatch.setattr(bot.bot, 'get_guild', lambda guild_id: None if guild_id in DEPARTED else present)
+    return store
+
+
+def stored_guilds(store):
+    return {int(key): value for key, value in store.tables['guild_settings'].items()}
+
+
+def test_unsharded_pass_reads_each_chunk_as_one_range(compaction):
+    store = compaction
+    removed, pruned = asyncio.run(bot.compact_guild_settings())
+    assert (removed, pruned) == (2, 0)
+    assert set(stored_guilds(store)) == set(GUILD_IDS) - set(DEPARTED)
+    by_string = sorted(str(guild_id) for guild_id in GUILD_IDS)
+    assert store.reads == [('range', by_string[:3]), ('range', by_string[3:])]
+
+
+def test_sharded_pass_fetches_only_its_own_guilds(compaction, monkeypatch):
+    store = compaction
+    monkeypatch.setattr(bot, 'shard_config', ShardConfig(2, [0], enabled=True))
+    asyncio.run(bot.compact_guild_settings())
+    read = [key for kind, keys in store.reads for key in keys]
+    assert all(kind == 'keys' for kind, _ in store.reads)
+    assert read and all(bot.shard_config.owns_guild(int(key)) for key in read)
+
+
+def test_deleted_channel_is_pruned(compaction):
+    store = compaction
+    guild_id = GUILD_IDS[1]
+    store.tables['guild_settings'][str(guild_id)] = settings([1, 2])
+    removed, pruned = asyncio.run(bot.compact_guild_settings())
+    assert pruned == 1
+    assert stored_guilds(store)[guild_id]['allowed_channels'] == [1]
+
+
+def test_edit_saved_during_the_read_is_not_overwritten(compaction):
+    store = compaction
+    guild_id = GUILD_IDS[1]
+    store.tables['guild_settings'][str(guild_id)] = settings([1, 2])
+
+    async def admin_adds_channel(keys):
+        # Made and flushed while the guild's chunk read was in flight, so nothing is pending locally
+        if str(guild_id) in keys:
+            await store.save_guild(guild_id, settings([1, 2, 3]))
+
+    store.during_read = admin_adds_channel
+    removed, pruned = asyncio.run(bot.compact_guild_settings())
+    assert pruned == 0
+    assert stored_guilds(store)[guild_id]['allowed_channels'] == [1, 2, 3]
+
+
+def test_pruning_the_last_channel_undoes_setup(compaction):
+    store = compaction
+    guild_id = GUILD_IDS[1]
+    store.tables['guild_settings'][str(guild_id)] = settings([2])
+    asyncio.run(bot.compact_guild_settings())
+    assert stored_guilds(store)[guild_id]['allowed_channels'] == []
+    assert stored_guilds(store)[guild_id]['setup_complete'] is False
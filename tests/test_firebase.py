@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import socket
+
+from fake_firebase import FakeFirebase
+from storage import SETTINGS_TABLE, FirebaseStorage
+
+# Snowflake-sized ids, which Firebase orders as strings
+GUILD_IDS = [100000000000000000 + n for n in range(200)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def firebase(data):
+    fake = FakeFirebase(data=data)
+    port = free_port()
+    await fake.start(port=port)
+    store = FirebaseStorage(f'http://127.0.0.1:{port}', 'test')
+    try:
+        yield fake, store
+    finally:
+        await store.close()
+        await fake.stop()
+
+
+def seeded():
+    return {SETTINGS_TABLE: {str(guild_id): {'cooldown_seconds': n} for n, guild_id in enumerate(GUILD_IDS)}}
+
+
+def test_scattered_keys_are_fetched_one_by_one():
+    async def main():
+        async with firebase(seeded()) as (fake, store):
+            wanted = [GUILD_IDS[0], GUILD_IDS[-1], 1]  # far apart, plus one never set up
+            loaded = await store.load_guilds(wanted)
+            return loaded, fake.requests['GET']
+
+    loaded, gets = asyncio.run(main())
+    assert loaded == {GUILD_IDS[0]: {'cooldown_seconds': 0}, GUILD_IDS[-1]: {'cooldown_seconds': 199}}
+    assert gets == 3
+
+
+def test_adjacent_keys_are_fetched_with_one_range_query():
+    async def main():
+        async with firebase(seeded()) as (fake, store):
+            keys = sorted(await store.list_keys(SETTINGS_TABLE))[50:100]
+            loaded = await store.load_key_range(SETTINGS_TABLE, keys)
+            return keys, loaded, fake.requests['GET']
+
+    keys, loaded, gets = asyncio.run(main())
+    assert sorted(loaded) == keys
+    assert gets == 2  # the listing and the range
+
+
+def test_stream_rereads_only_the_keys_changed_in_part():
+    first, last = str(GUILD_IDS[0]), str(GUILD_IDS[-1])
+
+    async def main():
+        async with firebase(seeded()) as (fake, store):
+            stream = store.watch(SETTINGS_TABLE)
+            table, complete = await stream.__anext__()
+            assert complete and len(table) == len(GUILD_IDS)
+            gets = fake.requests['GET']
+            # A multi-path PATCH below the guild keys, as a console edit of two fields would be
+            await store.save_keys(SETTINGS_TABLE, {f'{first}/cooldown_seconds': 5, f'{last}/cooldown_seconds': 6})
+            changes = await asyncio.wait_for(stream.__anext__(), timeout=5)
+            await stream.aclose()
+            return changes, fake.requests['GET'] - gets
+
+    (changes, complete), gets = asyncio.run(main())
+    assert not complete
+    assert changes == {first: {'cooldown_seconds': 5}, last: {'cooldown_seconds': 6}}
+    assert gets == 2
+
+
+def test_expired_cooldowns_are_deleted():
+    async def main():
+        data = {'cooldowns': {'1': 100, '2': 500, '3:4': 90}}
+        async with firebase(data) as (fake, store):
+            results = [await store.delete_expired_cooldown(key, now=200) for key in ('1', '2', '3:4', '5')]
+            return results, await store.load_cooldowns()
+
+    results, left = asyncio.run(main())
+    assert results == [True, False, True, False]
+    assert left == {'2': 500}
+
+
+def test_conditional_delete_loses_to_a_newer_claim():
+    async def main():
+        async with firebase({'cooldowns': {'1': 100}}) as (fake, store):
+            session = await store._get_session()
+            real_delete = session.delete
+
+            def claim_first(*args, **kwargs):
+                # Another process claims the cooldown between our read and our delete
+                fake.set('cooldowns/1', 900)
+                return real_delete(*args, **kwargs)
+
+            session.delete = claim_first
+            deleted = await store.delete_expired_cooldown('1', now=200)
+            session.delete = real_delete
+            return deleted, await store.load_cooldowns()
+
+    assert asyncio.run(main()) == (False, {'1': 900})
@@ -0,0 +1,23 @@
+from guild_config import GuildConfig
+
+
+def config(channels=(1, 2), roles=(7, 8)):
+    return GuildConfig(True, 60, channels, roles)
+
+
+def test_pruned_returns_self_when_nothing_was_deleted():
+    settings = config()
+    assert settings.pruned(lambda channel_id: True, lambda role_id: True) is settings
+
+
+def test_pruning_some_channels_and_roles_keeps_setup():
+    kept = config().pruned(lambda channel_id: channel_id == 1, lambda role_id: role_id == 8)
+    assert (kept.allowed_channels, kept.pinged_roles, kept.setup_complete) == ((1,), (8,), True)
+
+
+def test_losing_the_last_channel_or_role_clears_setup():
+    assert not config().pruned(lambda channel_id: False, lambda role_id: True).setup_complete
+    assert not config().pruned(lambda channel_id: True, lambda role_id: False).setup_complete
+    assert not config(channels=(1,)).without_channel(1).setup_complete
+    assert not config(roles=(7,)).without_role(7).setup_complete
+    assert config().without_channel(1).setup_complete
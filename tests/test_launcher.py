@@ -0,0 +1,16 @@
+import sys
+
+import pytest
+
+import launcher
+
+
+@pytest.mark.parametrize('env', [{}, {'STORAGE_BACKEND': 'log'}, {'STORAGE_BACKEND': 'memory'}])
+def test_refuses_a_backend_processes_cannot_share(env, monkeypatch):
+    for name in ('STORAGE_BACKEND', 'FIREBASE_URL'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(sys, 'argv', ['launcher.py', '--shards', '2', '--processes', '2'])
+    monkeypatch.setattr(launcher, 'spawn', lambda *args: pytest.fail("spawned a process"))
+    assert launcher.main() == 1
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import bot
+from raid_queue import QueuedRaid
+
+
+@pytest.fixture
+def queued():
+    """One raid queued for guild 1, with the settings cache emptied around the test"""
+    key = '1'
+    bot.raid_queue.push(key, QueuedRaid(10, 100, "need two more", 0), limit=5)
+    bot.settings_cache.invalidate(1)
+    yield key
+    bot.raid_queue.discard(key)
+    bot.settings_cache.invalidate(1)
+
+
+def test_failed_settings_load_keeps_the_queue(queued, monkeypatch):
+    async def failing_loader(guild_id):
+        raise RuntimeError("store down")
+
+    monkeypatch.setattr(bot.settings_cache, 'loader', failing_loader)
+    with pytest.raises(RuntimeError):
+        asyncio.run(bot.post_queued_raid(queued))
+    assert bot.raid_queue.length(queued) == 1
+
+
+def test_guild_without_settings_drops_the_queue(queued, monkeypatch):
+    async def missing_loader(guild_id):
+        return None
+
+    monkeypatch.setattr(bot.settings_cache, 'loader', missing_loader)
+    asyncio.run(bot.post_queued_raid(queued))
+    assert bot.raid_queue.length(queued) == 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import bot
+from guild_config import GuildConfig
+from storage import MemoryStorage
+
+GUILD_ID = 42
+
+
+def settings(channels):
+    """Stored form, as the bot itself writes it"""
+    return GuildConfig.from_dict({'setup_complete': True, 'allowed_channels': channels, 'pinged_roles': [7]}).to_dict()
+
+
+class SlowStorage(MemoryStorage):
+    """Runs a hook while a load_guilds read is in flight, after the value was read"""
+
+    during_read = None
+
+    async def load_keys(self, table, keys):
+        rows = await super().load_keys(table, keys)
+        if self.during_read:
+            await self.during_read()
+        return rows
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = SlowStorage({'guild_settings': {str(GUILD_ID): settings([1])}})
+    monkeypatch.setattr(bot, 'storage', store)
+    bot.settings_cache.set(GUILD_ID, GuildConfig.from_dict(settings([1])))
+    yield store
+    bot.settings_cache.invalidate(GUILD_ID)
+
+
+def test_reload_picks_up_a_direct_store_edit(store):
+    store.tables['guild_settings'][str(GUILD_ID)] = settings([1, 2])
+    result = asyncio.run(bot.reload_guild_settings())
+    assert result == {'checked': 1, 'changed': 1}
+    assert bot.settings_cache.peek(GUILD_ID).to_dict() == settings([1, 2])
+
+
+def test_reload_keeps_an_edit_flushed_during_the_read(store):
+    edited = GuildConfig.from_dict(settings([1, 3]))
+
+    async def admin_edit_flushed():
+        # Saved and acknowledged while the reload's read was in flight
+        bot.settings_cache.set(GUILD_ID, edited)
+        await MemoryStorage.save_guild(store, GUILD_ID, edited.to_dict())
+
+    store.during_read = admin_edit_flushed
+    result = asyncio.run(bot.reload_guild_settings())
+    assert result == {'checked': 0, 'changed': 0}
+    assert bot.settings_cache.peek(GUILD_ID) is edited
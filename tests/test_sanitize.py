@@ -0,0 +1,77 @@
+import random
+import re
+
+import pytest
+
+from bot import sanitize_message
+
+
+def original_sanitize_message(message: str) -> str:
+    """The sanitizer as first written, kept as the oracle for the optimized one"""
+    message = re.sub(r'@(everyone|here)', '', message, flags=re.IGNORECASE)
+    message = re.sub(r'<@!?\d+>', '', message)
+    message = re.sub(r'<@&\d+>', '', message)
+    message = re.sub(r'<#\d+>', '', message)
+    message = re.sub(r'\|\|([^|]+)\|\|', r'\1', message)
+    message = re.sub(r'```[^`]*```', '', message)
+    message = re.sub(r'`([^`]+)`', r'\1', message)
+    message = re.sub(r'^>\s*', '', message, flags=re.MULTILINE)
+    message = re.sub(r'\*\*([^*]+)\*\*', r'\1', message)
+    message = re.sub(r'__([^_]+)__', r'\1', message)
+    message = re.sub(r'\*([^*]+)\*', r'\1', message)
+    message = re.sub(r'_([^_]+)_', r'\1', message)
+    message = re.sub(r'~~([^~]+)~~', r'\1', message)
+    message = re.sub(r'~~([^~]+)~~', r'\1', message)
+    message = ' '.join(message.split())
+    return message.strip()
+
+
+CORPUS = [
+    "",
+    "   ",
+    "Looking for Vault of Glass fresh run tonight, need two more",
+    "  spaced\tout\n\nmessage  ",
+    "@everyone join the raid <@&555> now",
+    "@EVERYONE @Here @here @everyone@here",
+    "@@everyoneeveryone",
+    "<@123> <@!456> <@&789> <#1011>",
+    "<@<@1>&2>",
+    "<@&<@1>2>",
+    "<<#1>#2>",
+    "<@!> <@&> <#> <@abc>",
+    "||spoiler|| and ||| nested ||| and ||||",
+    "```code block``` then `inline` then ``",
+    "```unterminated and `half",
+    "````x````",
+    "> quoted\n>also quoted\n  > not at line start",
+    ">\n>\n> ",
+    "**Need** two more for *King's Fall* at reset ||bring relics||",
+    "__under__ _italic_ ___triple___ ____quad____",
+    "***bold italic*** **a*b** *a**b*",
+    "~~strike~~ ~~~~text~~~~ ~~~triple~~~ ~~~~~~six~~~~~~",
+    "~~a~~~~b~~",
+    "`@everyone` ||<@1>|| **<#2>**",
+    "<@1>@everyone<@&2>",
+    "@every<@1>one",
+    "a b c　d",
+    "emoji 🎉 **party** 🎉",
+    "_snake_case_name_ and __dunder__",
+]
+
+TOKENS = [
+    "@everyone", "@here", "@", "everyone", "here", "<", ">", "<@", "<@!", "<@&", "<#", "123", "&", "!", "#",
+    "|", "||", "`", "```", "*", "**", "_", "__", "~", "~~", ">", "\n", "\n> ", " ", "  ", "\t", " ",
+    "raid", "VoG", "need 2", "é", "🎉",
+]
+
+
+@pytest.mark.parametrize('message', CORPUS)
+def test_matches_original_on_fixed_corpus(message):
+    assert sanitize_message(message) == original_sanitize_message(message)
+
+
+def test_matches_original_on_random_corpus():
+    rng = random.Random(1234)
+    for _ in range(20000):
+        message = ''.join(rng.choice(TOKENS) for _ in range(rng.randint(0, 24)))
+        assert sanitize_message(message) == original_sanitize_message(message), repr(message)
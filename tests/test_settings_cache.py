@@ -0,0 +1,95 @@
+import asyncio
+
+from storage import GuildSettingsCache
+
+
+def test_concurrent_lookups_share_one_load():
+    calls = []
+
+    async def main():
+        async def loader(guild_id):
+            calls.append(guild_id)
+            await asyncio.sleep(0.01)
+            return {'cooldown_seconds': 30}
+
+        cache = GuildSettingsCache(loader)
+        return await asyncio.gather(*(cache.get(1) for _ in range(5)))
+
+    assert asyncio.run(main()) == [{'cooldown_seconds': 30}] * 5
+    assert calls == [1]
+
+
+def test_load_does_not_overwrite_a_newer_set():
+    async def main():
+        release = asyncio.Event()
+
+        async def loader(guild_id):
+            await release.wait()
+            return {'cooldown_seconds': 30}  # read before the edit below
+
+        cache = GuildSettingsCache(loader)
+        loading = asyncio.ensure_future(cache.get(1))
+        await asyncio.sleep(0)
+        cache.set(1, {'cooldown_seconds': 90})
+        release.set()
+        return await loading, cache.peek(1)
+
+    assert asyncio.run(main()) == ({'cooldown_seconds': 90}, {'cooldown_seconds': 90})
+
+
+def test_load_is_not_cached_after_an_invalidate():
+    async def main():
+        release = asyncio.Event()
+
+        async def loader(guild_id):
+            await release.wait()
+            return {'cooldown_seconds': 30}
+
+        cache = GuildSettingsCache(loader)
+        loading = asyncio.ensure_future(cache.get(1))
+        await asyncio.sleep(0)
+        cache.invalidate(1)
+        release.set()
+        await loading
+        return 1 in cache
+
+    assert asyncio.run(main()) is False
+
+
+def test_failed_load_is_not_cached():
+    async def main():
+        async def loader(guild_id):
+            raise RuntimeError("store down")
+
+        cache = GuildSettingsCache(loader)
+        try:
+            await cache.get(1)
+        except RuntimeError:
+            pass
+        return 1 in cache
+
+    assert asyncio.run(main()) is False
+
+
+def test_cancelled_load_releases_the_lookups_sharing_it():
+    async def main():
+        release = asyncio.Event()
+
+        async def loader(guild_id):
+            await release.wait()
+            return {'cooldown_seconds': 30}
+
+        cache = GuildSettingsCache(loader)
+        first = asyncio.ensure_future(cache.get(1))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get(1))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), timeout=1)
+        assert first.cancelled()
+        assert isinstance(second.exception(), RuntimeError)
+        # The next lookup starts a fresh load
+        release.set()
+        return await asyncio.wait_for(cache.get(1), timeout=1)
+
+    assert asyncio.run(main()) == {'cooldown_seconds': 30}
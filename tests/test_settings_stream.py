@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def settings_stream(**env) -> bool:
+    """SETTINGS_STREAM as a fresh bot process would compute it (it is read at import time)"""
+    environ = {key: value for key, value in os.environ.items() if key not in ('SHARD_COUNT', 'SETTINGS_STREAM')}
+    environ.update(env, STORAGE_BACKEND='memory')
+    output = subprocess.run(
+        [sys.executable, '-c', 'import bot; print(bot.SETTINGS_STREAM)'],
+        cwd=ROOT, env=environ, capture_output=True, text=True, check=True
+    ).stdout
+    return output.strip().splitlines()[-1] == 'True'
+
+
+@pytest.mark.parametrize('env, expected', [
+    ({}, False),
+    ({'SHARD_COUNT': '4', 'SHARD_IDS': '0-1'}, True),
+    ({'SETTINGS_STREAM': '1'}, True),
+    ({'SHARD_COUNT': '4', 'SETTINGS_STREAM': '0'}, False),
+])
+def test_stream_is_opt_in_for_a_single_process(env, expected):
+    assert settings_stream(**env) is expected
@@ -0,0 +1,64 @@
+import asyncio
+
+from storage import WriteBehindBuffer
+
+
+def test_close_waits_for_a_write_in_flight():
+    saved = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def save(changes):
+            await release.wait()
+            saved.append(dict(changes))
+
+        buffer = WriteBehindBuffer(save, delay=0)
+        buffer.mark_dirty(1, {'cooldown_seconds': 60})
+        await asyncio.sleep(0.01)  # the background flush is now awaiting save
+        closing = asyncio.ensure_future(buffer.close())
+        await asyncio.sleep(0.01)
+        release.set()
+        await closing
+        return buffer
+
+    buffer = asyncio.run(main())
+    assert saved == [{1: {'cooldown_seconds': 60}}]
+    assert buffer.pending == 0
+
+
+def test_cancelled_flush_keeps_the_batch():
+    calls = []
+
+    async def main():
+        async def save(changes):
+            calls.append(dict(changes))
+            if len(calls) == 1:
+                await asyncio.sleep(3600)
+
+        buffer = WriteBehindBuffer(save, delay=0)
+        buffer.mark_dirty(1, 'first')
+        await asyncio.sleep(0.01)
+        buffer._task.cancel()
+        await asyncio.gather(buffer._task, return_exceptions=True)
+        assert buffer.pending == 1 and buffer.is_pending(1)
+        assert await buffer.flush()
+        return buffer
+
+    buffer = asyncio.run(main())
+    assert calls == [{1: 'first'}, {1: 'first'}]
+    assert buffer.pending == 0
+
+
+def test_failed_flush_keeps_newer_edits():
+    async def main():
+        async def save(changes):
+            buffer.mark_dirty(1, 'newer')  # edited while the write was in flight
+            raise RuntimeError("store down")
+
+        buffer = WriteBehindBuffer(save, delay=3600)
+        buffer.mark_dirty(1, 'older')
+        assert not await buffer.flush()
+        return buffer.pending_value(1)
+
+    assert asyncio.run(main()) == 'newer'
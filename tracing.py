@@ -0,0 +1,205 @@
+"""
+Sampled per-command tracing and on-demand profiling
+
+The command tree starts a Trace for a sampled interaction and keeps it in a
+context variable for the task running the command. span() blocks time the
+phases inside it (settings load, sanitizing, storage calls, Discord sends), and
+the finished trace is written as one JSON line to a rotating file. Unsampled
+commands, and every command when TRACE_SAMPLE_RATE is 0, pay one context
+variable lookup per span.
+
+ProfileCapture runs yappi (if installed) or cProfile over everything the event
+loop does for a fixed window and saves a pstats file.
+"""
+
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional, Tuple
+
+try:
+    import yappi
+except ImportError:
+    yappi = None  # yappi is optional; cProfile is used without it
+
+
+class Trace:
+    """Span timings for one command"""
+    __slots__ = ('command', 'guild_id', 'interaction_id', 'started', 'started_at', 'spans', 'done')
+
+    def __init__(self, command: str, guild_id: Optional[int], interaction_id: int, started: float):
+        self.command = command
+        self.guild_id = guild_id
+        self.interaction_id = interaction_id
+        self.started = started
+        self.started_at = time.time()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.done = False
+
+    def add(self, name: str, start: float, end: float):
+        # Background tasks started by the command inherit its context; ignore them once it has finished
+        if not self.done:
+            self.spans.append((name, start, end))
+
+    def to_dict(self, outcome: str, ended: float) -> dict:
+        return {
+            'ts': round(self.started_at, 3),
+            'command': self.command,
+            'guild_id': self.guild_id,
+            'interaction_id': self.interaction_id,
+            'outcome': outcome,
+            'duration_ms': round((ended - self.started) * 1000, 3),
+            'spans': [
+                {'name': name, 'start_ms': round((start - self.started) * 1000, 3),
+                 'duration_ms': round((end - start) * 1000, 3)}
+                for name, start, end in self.spans
+            ],
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add(self.name, self.started, time.perf_counter())
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    """Time a block as part of the current command's trace (a no-op when it is not sampled)"""
+    trace = _current.get()
+    return _NO_SPAN if trace is None else _Span(trace, name)
+
+
+class Tracer:
+    """Samples commands and writes their traces to a rotating JSONL file"""
+
+    def __init__(self, sample_rate: float = 0.0, path: str = 'traces.jsonl',
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.sample_rate = sample_rate
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._log: Optional[logging.Logger] = None
+
+    @classmethod
+    def from_env(cls) -> 'Tracer':
+        """TRACE_SAMPLE_RATE (0-1, default 0), TRACE_FILE, TRACE_MAX_BYTES and TRACE_BACKUPS"""
+        return cls(
+            sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', 0)),
+            path=os.getenv('TRACE_FILE', 'traces.jsonl'),
+            max_bytes=int(os.getenv('TRACE_MAX_BYTES', 10 * 1024 * 1024)),
+            backups=int(os.getenv('TRACE_BACKUPS', 5)),
+        )
+
+    def _logger(self) -> logging.Logger:
+        """Open the trace file on first use, so an unsampled bot never creates it"""
+        if self._log is None:
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                          encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._log = logging.getLogger(f'raidrequest.traces.{self.path}')
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            self._log.addHandler(handler)
+        return self._log
+
+    def start(self, interaction, started: float) -> Optional[Trace]:
+        """Begin tracing an interaction in the current task if it is sampled"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        command = interaction.command.name if interaction.command is not None else 'unknown'
+        trace = Trace(command, interaction.guild_id, interaction.id, started)
+        _current.set(trace)
+        return trace
+
+    def finish(self, trace: Trace, outcome: str):
+        """Write a finished trace"""
+        trace.done = True
+        try:
+            self._logger().info(json.dumps(trace.to_dict(outcome, time.perf_counter())))
+        except OSError as e:
+            print(f"Error writing trace: {e}")
+
+
+class ProfileCapture:
+    """Profiles the whole event loop for a window; one capture at a time"""
+
+    def __init__(self, directory: str = 'profiles'):
+        self.directory = directory
+        self.running = False
+
+    @property
+    def engine(self) -> str:
+        return 'yappi' if yappi is not None else 'cProfile'
+
+    async def capture(self, seconds: float, top: int = 15) -> Tuple[str, str]:
+        """Profile for seconds; returns (pstats file, top functions by own time)"""
+        if self.running:
+            raise RuntimeError("A profile is already being captured")
+        self.running = True
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, time.strftime('profile-%Y%m%d-%H%M%S.prof'))
+            if yappi is not None:
+                # Wall clock, so time spent awaiting I/O is attributed to the coroutine waiting
+                yappi.set_clock_type('wall')
+                yappi.clear_stats()
+                yappi.start()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    yappi.stop()
+                yappi.get_func_stats().save(path, type='pstat')
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profiler.disable()
+                profiler.dump_stats(path)
+            return path, summarize_profile(path, top)
+        finally:
+            self.running = False
+
+
+def summarize_profile(path: str, top: int = 15) -> str:
+    """Compact table of the functions with the most own time in a pstats file"""
+    stats = pstats.Stats(path).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    lines = [f"{'own ms':>9} {'cum ms':>9} {'calls':>8}  function"]
+    for (filename, line, function), (_, calls, own, cumulative, _) in rows:
+        lines.append(f"{own * 1000:9.1f} {cumulative * 1000:9.1f} {calls:8}  "
+                     f"{os.path.basename(filename)}:{line}({function})")
+    return '\n'.join(lines)
@@ -1,5 +1,111 @@
+"""
+Health check HTTP server that runs on the bot's own event loop
+
+Serves "/" (plain liveness text for Render's port binding), "/healthz"
+(gateway connected and heartbeating), "/readyz" (bot finished logging in)
+and, when a metrics registry is given, "/metrics" in Prometheus text format.
+With ADMIN_TOKEN set and a reload callback given, "POST /admin/reload" re-reads
+changed guild settings (send "Authorization: Bearer <ADMIN_TOKEN>").
+"""
+
+import hmac
+import math
 import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+# A heartbeat ACK older than this means the gateway connection is stuck
+# (Discord's heartbeat interval is about 41 seconds)
+HEARTBEAT_STALE_SECONDS = 90
+
+
+def _websockets(bot) -> List:
+    """The gateway websocket(s) of a plain or auto-sharded bot"""
+    shards = getattr(bot, 'shards', None)
+    if isinstance(shards, dict) and shards:
+        return [getattr(getattr(info, '_parent', None), 'ws', None) for info in shards.values()]
+    return [getattr(bot, 'ws', None)]
+
+
+def _heartbeat_age(ws) -> Optional[float]:
+    """Seconds since the gateway last acknowledged a heartbeat, if known"""
+    keep_alive = getattr(ws, '_keep_alive', None)
+    last_ack = getattr(keep_alive, '_last_ack', None)
+    if last_ack is None:
+        return None
+    return time.perf_counter() - last_ack
+
+
+def health_status(bot) -> Dict:
+    """Gateway connection, latency and heartbeat details for /healthz"""
+    websockets = _websockets(bot)
+    connected = not bot.is_closed() and all(ws is not None and ws.open for ws in websockets)
+    ages = [age for age in (_heartbeat_age(ws) for ws in websockets if ws is not None) if age is not None]
+    latency = bot.latency
+    oldest_ack = max(ages) if ages else None
+    healthy = connected and (oldest_ack is None or oldest_ack < HEARTBEAT_STALE_SECONDS)
+    return {
+        'status': 'ok' if healthy else 'unhealthy',
+        'gateway_connected': connected,
+        'shards': len(websockets),
+        'latency_ms': round(latency * 1000, 1) if math.isfinite(latency) else None,
+        'last_heartbeat_ack_seconds': round(oldest_ack, 1) if oldest_ack is not None else None,
+    }
+
+
+class HealthServer:
+    """aiohttp app for liveness and readiness probes"""
+
+    def __init__(self, bot, host: str = '0.0.0.0', port: Optional[int] = None, metrics_registry=None,
+                 reload: Optional[Callable[[], Awaitable[Dict]]] = None, admin_token: Optional[str] = None):
+        self.bot = bot
+        self.metrics_registry = metrics_registry
+        self.reload = reload
+        self.admin_token = admin_token if admin_token is not None else os.environ.get("ADMIN_TOKEN")
+        self.host = host
+        self.port = port if port is not None else int(os.environ.get("PORT", 10000))
+        self.app = web.Application()
+        self.app.router.add_get('/', self.home)
+        self.app.router.add_get('/healthz', self.healthz)
+        self.app.router.add_get('/readyz', self.readyz)
+        if metrics_registry is not None:
+            self.app.router.add_get('/metrics', self.metrics)
+        if reload is not None and self.admin_token:
+            self.app.router.add_post('/admin/reload', self.admin_reload)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def home(self, request: web.Request) -> web.Response:
+        return web.Response(text="RaidRequest bot is running!")
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        status = health_status(self.bot)
+        return web.json_response(status, status=200 if status['status'] == 'ok' else 503)
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        # Report not ready while draining so deploys stop sending traffic here
+        ready = self.bot.is_ready() and not self.bot.is_closed() and not getattr(self.bot, 'shutting_down', False)
+        return web.json_response({'ready': ready}, status=200 if ready else 503)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics_registry.render().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def admin_reload(self, request: web.Request) -> web.Response:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {self.admin_token}".encode()):
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        return web.json_response(await self.reload())
+
+    async def start(self):
+        """Start listening without blocking the event loop"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"Health server listening on port {self.port}")
 
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 10000))
-    print(f"RaidRequest bot is running on port {port}!")
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None